@@ -1,33 +1,48 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    unauthorized = HTTPException(
+def _unauthorized() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
     )
+
+def _user_id_from_token(token: str) -> int:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         subject = payload.get("sub")
         user_id = int(subject) if subject is not None else None
     except (JWTError, ValueError, TypeError):
-        raise unauthorized
+        raise _unauthorized()
 
     if not user_id:
-        raise unauthorized
+        raise _unauthorized()
+    return user_id
 
-    user = db.get(User, user_id)
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    user = db.get(User, _user_id_from_token(token))
+    if not user:
+        raise _unauthorized()
+    return user
+
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    """async def のルーター用。同じリクエスト内では get_async_db のセッションを共有する。"""
+    user = await db.get(User, _user_id_from_token(token))
     if not user:
-        raise unauthorized
+        raise _unauthorized()
     return user
\ No newline at end of file
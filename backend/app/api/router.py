@@ -1,15 +1,20 @@
 from fastapi import APIRouter
 
-from app.api.routers import analytics, auth, friendships, goals, groups, posts, tasks, users, stripe_api
+from app.api.routers import analytics, auth, breakdown_jobs, diagnostics, friendships, goals, groups, me, posts, tasks, users, stripe_api
+from app.core.config import settings
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router)
 api_router.include_router(users.router)
+api_router.include_router(me.router)
 api_router.include_router(goals.router)
 api_router.include_router(tasks.router)
+api_router.include_router(breakdown_jobs.router)
 api_router.include_router(posts.router)
 api_router.include_router(analytics.router)
 api_router.include_router(groups.router)
 api_router.include_router(friendships.router)
-api_router.include_router(stripe_api.router)
\ No newline at end of file
+api_router.include_router(stripe_api.router)
+if settings.DIAGNOSTICS_ENABLED:
+    api_router.include_router(diagnostics.router)
@@ -1,46 +1,124 @@
-from fastapi import APIRouter, Depends
+import datetime as dt
+from collections import defaultdict
+
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
-from app.models.friendship import Friendship
+from app.api.deps import get_current_user_async
+from app.api.utils.conditional import make_etag, not_modified
+from app.core.config import settings
+from app.db.session import get_async_db
+from app.models.ai_usage import AIUsageDaily, AIUsageEvent
 from app.models.task import Task, TaskType
 from app.models.user import User
+from app.schemas.ai_usage import AILatencyItem, AIUsageDay, AIUsageReport
 from app.schemas.ranking import RankingItem
+from app.services.feed import friend_ids as load_friend_ids
+from app.services.ranking import weekly_ranking
 
+# AsyncSession で動かす（スレッドプールを使わない）
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
 @router.get("/ranking", response_model=list[RankingItem])
-def get_ranking(user_id: int, week: int, top_n: int = 3, db: Session = Depends(get_db)):
-    friend_ids = list(db.scalars(select(Friendship.friend_id).where(Friendship.user_id == user_id)))
-    target_ids = list(dict.fromkeys([user_id, *friend_ids]))
-    users = list(db.scalars(select(User).where(User.id.in_(target_ids))))
-
-    ranking_items: list[RankingItem] = []
-    for user in users:
-        total_stmt = select(func.count()).select_from(Task).where(
-            Task.user_id == user.id,
+async def get_ranking(
+    user_id: int,
+    week: int,
+    request: Request,
+    response: Response,
+    top_n: int = 3,
+    db: AsyncSession = Depends(get_async_db),
+):
+    target_ids = list(dict.fromkeys([user_id, *await load_friend_ids(db, user_id)]))
+
+    # 対象ユーザーのその週の日次タスクと、ユーザー情報の変化だけを見る
+    version = await db.execute(
+        select(func.count(), func.max(Task.updated_at)).where(
+            Task.user_id.in_(target_ids),
             Task.type == TaskType.daily,
             Task.week_number == week,
         )
-        done_stmt = select(func.count()).select_from(Task).where(
-            Task.user_id == user.id,
-            Task.type == TaskType.daily,
-            Task.week_number == week,
-            Task.is_done.is_(True),
+    )
+    count, task_updated = version.one()
+    user_updated = await db.scalar(select(func.max(User.updated_at)).where(User.id.in_(target_ids)))
+    last_modified = max((value for value in (task_updated, user_updated) if value is not None), default=None)
+    etag = make_etag("ranking", sorted(target_ids), week, top_n, count, task_updated, user_updated)
+    cached = not_modified(request, response, etag, last_modified)
+    if cached:
+        return cached
+
+    return await weekly_ranking(db, target_ids, week, top_n)
+
+
+@router.get("/ai-usage", response_model=AIUsageReport)
+async def get_ai_usage(
+    days: int = Query(default=30, ge=1, le=365),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    """日次集計テーブルだけを読む（主キー (user_id, day) の範囲検索）。"""
+    today = dt.date.today()
+    rows = list(
+        await db.scalars(
+            select(AIUsageDaily)
+            .where(AIUsageDaily.user_id == current_user.id, AIUsageDaily.day > today - dt.timedelta(days=days))
+            .order_by(AIUsageDaily.day.desc())
         )
-        total = db.scalar(total_stmt) or 0
-        done = db.scalar(done_stmt) or 0
-        achieved_rate = (done / total) if total > 0 else 0.0
-        ranking_items.append(
-            RankingItem(
-                user_id=user.id,
-                user_name=user.name,
-                achieved_avg=float(achieved_rate),
-                avatar_url=user.avatar_url,
+    )
+    return AIUsageReport(
+        breakdown_limit=None if current_user.is_premium else settings.FREE_DAILY_BREAKDOWN_LIMIT,
+        breakdowns_today=next((row.breakdowns for row in rows if row.day == today), 0),
+        days=[
+            AIUsageDay(
+                day=row.day,
+                breakdowns=row.breakdowns,
+                calls=row.calls,
+                failed_calls=row.failed_calls,
+                prompt_tokens=row.prompt_tokens,
+                output_tokens=row.output_tokens,
+                avg_latency_ms=(row.latency_ms_total / row.calls) if row.calls else None,
             )
+            for row in rows
+        ],
+    )
+
+
+def _percentile(values: list[int], p: float) -> int:
+    idx = min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))
+    return values[idx]
+
+
+@router.get("/ai-latency", response_model=list[AILatencyItem])
+async def get_ai_latency(
+    days: int = Query(default=7, ge=1, le=90),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    """呼び出し種別・モデルごとのレイテンシ分布。(user_id, day) インデックスで対象期間のイベントだけを読む。"""
+    since = dt.date.today() - dt.timedelta(days=days - 1)
+    rows = await db.execute(
+        select(AIUsageEvent.kind, AIUsageEvent.model, AIUsageEvent.ok, AIUsageEvent.latency_ms).where(
+            AIUsageEvent.user_id == current_user.id, AIUsageEvent.day >= since
         )
+    )
+    groups: dict[tuple[str, str], list[tuple[bool, int]]] = defaultdict(list)
+    for kind, model, ok, latency_ms in rows:
+        groups[(kind, model)].append((ok, latency_ms))
 
-    ranking_items.sort(key=lambda item: item.achieved_avg, reverse=True)
-    return ranking_items[:top_n] if top_n > 0 else ranking_items
+    items: list[AILatencyItem] = []
+    for (kind, model), calls in sorted(groups.items()):
+        latencies = sorted(latency for _, latency in calls)
+        items.append(
+            AILatencyItem(
+                kind=kind,
+                model=model,
+                calls=len(calls),
+                failed_calls=sum(1 for ok, _ in calls if not ok),
+                p50_ms=_percentile(latencies, 50),
+                p95_ms=_percentile(latencies, 95),
+                p99_ms=_percentile(latencies, 99),
+                max_ms=latencies[-1],
+            )
+        )
+    return items
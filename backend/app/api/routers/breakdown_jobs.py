@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user
+from app.db.session import get_db
+from app.models.breakdown_job import BreakdownJob
+from app.models.user import User
+from app.schemas.breakdown_job import BreakdownJobRead
+from app.services.breakdown_jobs import to_job_read
+
+router = APIRouter(prefix="/breakdown-jobs", tags=["breakdown-jobs"])
+
+
+@router.get("/{job_id}", response_model=BreakdownJobRead)
+def get_breakdown_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    job = db.get(BreakdownJob, job_id)
+    if not job or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return to_job_read(job)
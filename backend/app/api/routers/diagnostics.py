@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.models.user import User
+from app.services.ai_scheduler import ai_scheduler
+from app.services.ai_usage import usage_recorder
+from app.services.breakdown_cache import breakdown_cache
+from app.services.breakdown_jobs import breakdown_job_runner
+from app.services.carry_over import carry_over_scheduler
+from app.services.gemini_client import endpoint_resolver, gemini_breaker, gemini_stats
+from app.services.idempotency import idempotency_store
+from app.services.task_service import breakdown_flights
+
+
+def require_diagnostics_admin(current_user: User = Depends(get_current_user)) -> User:
+    admins = {email.strip().lower() for email in settings.DIAGNOSTICS_ADMIN_EMAILS.split(",") if email.strip()}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    return current_user
+
+
+router = APIRouter(prefix="/diagnostics", tags=["diagnostics"], dependencies=[Depends(require_diagnostics_admin)])
+
+
+@router.get("/gemini")
+def gemini_diagnostics():
+    return {
+        "endpoint": endpoint_resolver.snapshot(),
+        "calls": dict(gemini_stats),
+        "circuit": gemini_breaker.snapshot(),
+        "breakdown_cache": breakdown_cache.stats(),
+        "breakdown_jobs": breakdown_job_runner.stats(),
+        "breakdown_flights": breakdown_flights.stats(),
+        "usage_recorder": usage_recorder.stats(),
+        "scheduler": ai_scheduler.stats(),
+        "carry_over": carry_over_scheduler.stats(),
+        "idempotency": idempotency_store.stats(),
+    }
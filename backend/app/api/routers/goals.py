@@ -1,16 +1,24 @@
+from datetime import date
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.models.goal import Goal
-from app.models.task import Task, TaskType
+from app.models.task import Task
 from app.models.user import User
 from app.schemas.goal import GoalCreate, GoalRead, GoalUpdate
-from app.api.deps import get_current_user
-from app.services.task_service import build_breakdown, derive_breakdown_scope, parse_note_subtasks
+from app.schemas.plan import GoalPlan
+from app.api.deps import get_current_user, get_current_user_async
+from app.api.utils.pagination import PageParams, SortKey, page_params, paginate
+from app.services.breakdown_jobs import submit_breakdown_job
+from app.services.goal_plan import load_goal_plan
+from app.services.task_service import coalesced_breakdown, derive_breakdown_scope
 
 router = APIRouter(prefix="/goals", tags=["goals"])
 
@@ -32,9 +40,16 @@ def create_goal(payload: GoalCreate, db: Session = Depends(get_db), current_user
     db.refresh(goal)
     return goal
 
+GOAL_LIST_ORDER = [SortKey(Goal.created_at, descending=True), SortKey(Goal.id, descending=True)]
+
 @router.get("", response_model=list[GoalRead])
-def list_goals(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return list(db.scalars(select(Goal).where(Goal.user_id == current_user.id).order_by(Goal.created_at.desc())))
+def list_goals(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    return paginate(db, select(Goal).where(Goal.user_id == current_user.id), GOAL_LIST_ORDER, page, response)
 
 @router.get("/{goal_id}", response_model=GoalRead)
 def get_goal(goal_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -43,6 +58,22 @@ def get_goal(goal_id: int, db: Session = Depends(get_db), current_user: User = D
         raise HTTPException(status_code=404, detail="Goal not found")
     return goal
 
+@router.get("/{goal_id}/plan", response_model=GoalPlan)
+async def get_goal_plan(
+    goal_id: int,
+    start: date | None = None,
+    end: date | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    """月次 → 週次 → 日次の木を1回のクエリで返す（サブタスクは分解済み）。start / end で日次の期間を絞れる。"""
+    goal = await db.get(Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    return await load_goal_plan(db, goal.id, start, end)
+
 @router.put("/{goal_id}", response_model=GoalRead)
 def update_goal(goal_id: int, payload: GoalUpdate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     goal = db.get(Goal, goal_id)
@@ -64,13 +95,14 @@ def delete_goal(goal_id: int, db: Session = Depends(get_db), current_user: User
     db.commit()
 
 @router.post("/{goal_id}/tasks/breakdown")
-def generate_breakdown(
+async def generate_breakdown(
     goal_id: int,
     payload: BreakdownRequest,
+    async_job: bool = Query(default=False, alias="async"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    goal = db.get(Goal, goal_id)
+    goal = await run_in_threadpool(db.get, Goal, goal_id)
     if not goal or goal.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Goal not found")
 
@@ -82,7 +114,24 @@ def generate_breakdown(
         months, weeks_per_month, days_per_week, yearly_milestones = derive_breakdown_scope(goal.deadline)
 
     situation = (payload.current_situation or "").strip() or (getattr(goal, "current_situation", None) or "").strip() or None
-    breakdown_res = build_breakdown(
+    if async_job:
+        submitted = await submit_breakdown_job(
+            db,
+            goal,
+            current_user,
+            {
+                "months": months,
+                "weeks_per_month": weeks_per_month,
+                "days_per_week": days_per_week,
+                "yearly_milestones": yearly_milestones,
+                "current_situation": situation,
+                "persist": payload.persist,
+                "replace_existing": False,
+            },
+        )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=submitted.model_dump())
+
+    return await coalesced_breakdown(
         db=db,
         current_user=current_user,
         goal=goal,
@@ -91,31 +140,6 @@ def generate_breakdown(
         days_per_week=days_per_week,
         yearly_milestones=yearly_milestones,
         current_situation=situation,
+        persist=payload.persist,
+        replace_existing=False,
     )
-
-    if payload.persist:
-        for m in breakdown_res.monthly:
-            db.add(Task(goal_id=goal.id, user_id=goal.user_id, **m.model_dump()))
-        for w in breakdown_res.weekly:
-            db.add(Task(goal_id=goal.id, user_id=goal.user_id, **w.model_dump()))
-        for d in breakdown_res.daily:
-            subtasks = parse_note_subtasks(d.note)
-            if subtasks:
-                for sub in subtasks:
-                    db.add(
-                        Task(
-                            goal_id=goal.id,
-                            user_id=goal.user_id,
-                            type=TaskType.daily,
-                            title=sub,
-                            month=d.month,
-                            week_number=d.week_number,
-                            date=d.date,
-                            note=None,
-                        )
-                    )
-            else:
-                db.add(Task(goal_id=goal.id, user_id=goal.user_id, **d.model_dump()))
-        db.commit()
-
-    return breakdown_res
\ No newline at end of file
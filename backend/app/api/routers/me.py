@@ -0,0 +1,81 @@
+import asyncio
+from datetime import date
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.api.deps import get_current_user_async
+from app.api.utils.pagination import PageParams, page_query, split_page
+from app.db.session import AsyncSessionLocal, get_async_db
+from app.models.post import Post
+from app.models.task import TaskType
+from app.models.user import User
+from app.schemas.dashboard import TodayDashboard
+from app.services.carry_over import local_today
+from app.services.feed import POST_LIST_ORDER, friend_ids, to_post_read
+from app.services.ranking import weekly_ranking
+from app.services.task_lists import today_tasks
+
+router = APIRouter(prefix="/me", tags=["me"])
+
+
+async def _tasks(user_id: int, day: date):
+    async with AsyncSessionLocal() as db:
+        return await today_tasks(db, user_id, day)
+
+
+async def _ranking(target_ids: list[int], week: int, top_n: int):
+    async with AsyncSessionLocal() as db:
+        return await weekly_ranking(db, target_ids, week, top_n)
+
+
+async def _posts(user_id: int, visible_ids: list[int], week: int, limit: int):
+    async with AsyncSessionLocal() as db:
+        page = PageParams(cursor=None, limit=limit)
+        stmt = (
+            select(Post)
+            .where(Post.week_number == week, Post.user_id.in_(visible_ids))
+            .options(selectinload(Post.user), selectinload(Post.likes))
+        )
+        rows, next_cursor = split_page(list(await db.scalars(page_query(stmt, POST_LIST_ORDER, page))), POST_LIST_ORDER, page)
+        return [to_post_read(post, user_id) for post in rows], next_cursor
+
+
+@router.get("/today", response_model=TodayDashboard)
+async def get_today(
+    date_value: date | None = Query(default=None, alias="date"),
+    top_n: int = Query(default=3, ge=0),
+    posts_limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    """
+    ホーム画面用。今日・今週・今月のタスク、ランキング、フィードの1ページ目を1回で返す。
+    認証と友達の一覧はリクエストのセッションで1回だけ引き、接続を返してから
+    タスク（3種類を1クエリ）・ランキング・フィードの3つを別セッションで同時に流す。
+    """
+    day = date_value or local_today()
+    week = day.isocalendar().week
+    user_id = current_user.id
+    visible_ids = list(dict.fromkeys([user_id, *await friend_ids(db, user_id)]))
+    # 接続を持ったまま別セッションを待つと、混雑時にプールを食い合って詰まる
+    await db.close()
+
+    tasks, ranking, (posts, posts_next_cursor) = await asyncio.gather(
+        _tasks(user_id, day),
+        _ranking(visible_ids, week, top_n),
+        _posts(user_id, visible_ids, week, posts_limit),
+    )
+    return TodayDashboard(
+        date=day,
+        week_number=week,
+        month=day.month,
+        daily_tasks=tasks[TaskType.daily],
+        weekly_tasks=tasks[TaskType.weekly],
+        monthly_tasks=tasks[TaskType.monthly],
+        ranking=ranking,
+        posts=posts,
+        posts_next_cursor=posts_next_cursor,
+    )
@@ -1,90 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from datetime import datetime
 
-from app.db.session import get_db
-from app.models.friendship import Friendship
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.api.utils.conditional import make_etag, not_modified
+from app.api.utils.pagination import PageParams, page_params, paginate_async
+from app.db.session import get_async_db
 from app.models.post import Post, PostLike
+from app.models.user import User
 from app.schemas.post import PostCreate, PostRead, PostUpdate
+from app.services.feed import POST_LIST_ORDER, friend_ids, to_post_read
 
+# AsyncSession で動かす。async では遅延ロードができないので、関連は selectinload で先に読む
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.post("", response_model=PostRead, status_code=status.HTTP_201_CREATED)
-def create_post(payload: PostCreate, db: Session = Depends(get_db)):
+async def create_post(payload: PostCreate, db: AsyncSession = Depends(get_async_db)):
     week_number = payload.date.isocalendar().week
     post = Post(**payload.model_dump(), week_number=week_number)
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    await db.refresh(post)
     return post
 
 @router.get("", response_model=list[PostRead])
-def list_posts(
+async def list_posts(
     week: int,
+    request: Request,
+    response: Response,
     user_id: int | None = None,
     group_id: int | None = None,
-    db: Session = Depends(get_db),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    stmt = select(Post).where(Post.week_number == week)
+    conditions = [Post.week_number == week]
     if group_id is not None:
-        stmt = stmt.where(Post.group_id == group_id)
+        conditions.append(Post.group_id == group_id)
     if user_id is not None:
-        friend_ids = list(
-            db.scalars(select(Friendship.friend_id).where(Friendship.user_id == user_id))
-        )
-        visible_ids = [user_id, *friend_ids]
-        stmt = stmt.where(Post.user_id.in_(visible_ids))
-        
-    posts = list(db.scalars(stmt.order_by(Post.created_at.desc())))
-    
-    results = []
-    for p in posts:
-        pr = PostRead.model_validate(p)
-        pr.user_name = p.user.name if p.user else None
-        pr.user_avatar_url = p.user.avatar_url if p.user else None
-        pr.likes_count = len(p.likes)
-        pr.is_liked_by_you = any(like.user_id == user_id for like in p.likes) if user_id else False
-        results.append(pr)
-        
-    return results
+        visible_ids = [user_id, *await friend_ids(db, user_id)]
+        conditions.append(Post.user_id.in_(visible_ids))
+
+    # 投稿の編集・いいね（Post.updated_at）と投稿者の名前・アイコン（User.updated_at）の変化を検知する
+    version = await db.execute(
+        select(func.count(), func.max(Post.updated_at), func.max(User.updated_at))
+        .join(User, User.id == Post.user_id)
+        .where(*conditions)
+    )
+    count, post_updated, user_updated = version.one()
+    last_modified = max((value for value in (post_updated, user_updated) if value is not None), default=None)
+    etag = make_etag("posts", week, user_id, group_id, count, post_updated, user_updated, page.cursor, page.limit)
+    cached = not_modified(request, response, etag, last_modified)
+    if cached:
+        return cached
+
+    stmt = select(Post).where(*conditions).options(selectinload(Post.user), selectinload(Post.likes))
+    posts = await paginate_async(db, stmt, POST_LIST_ORDER, page, response)
+    return [to_post_read(p, user_id) for p in posts]
 
 @router.post("/{post_id}/like", response_model=PostRead)
-def toggle_like(post_id: int, user_id: int, db: Session = Depends(get_db)):
-    post = db.get(Post, post_id)
+async def toggle_like(post_id: int, user_id: int, db: AsyncSession = Depends(get_async_db)):
+    post = await db.get(Post, post_id, options=[selectinload(Post.user)])
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    like = db.scalar(select(PostLike).where(PostLike.post_id == post_id, PostLike.user_id == user_id))
+    like = await db.scalar(select(PostLike).where(PostLike.post_id == post_id, PostLike.user_id == user_id))
     if like:
-        db.delete(like)
+        await db.delete(like)
     else:
         db.add(PostLike(post_id=post_id, user_id=user_id))
+    # いいね数は一覧に出るので、投稿側の更新日時も進める
+    post.updated_at = datetime.utcnow()
         
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    likes_count = await db.scalar(select(func.count()).select_from(PostLike).where(PostLike.post_id == post_id))
     
     pr = PostRead.model_validate(post)
     pr.user_name = post.user.name if post.user else None
     pr.user_avatar_url = post.user.avatar_url if post.user else None
-    pr.likes_count = len(post.likes)
+    pr.likes_count = likes_count or 0
     pr.is_liked_by_you = not bool(like)
     return pr
 
 @router.put("/{post_id}", response_model=PostRead)
-def update_post(post_id: int, payload: PostUpdate, db: Session = Depends(get_db)):
-    post = db.get(Post, post_id)
+async def update_post(post_id: int, payload: PostUpdate, db: AsyncSession = Depends(get_async_db)):
+    post = await db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     for field, value in payload.model_dump(exclude_none=True).items():
         setattr(post, field, value)
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    await db.refresh(post)
     return post
 
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(post_id: int, db: Session = Depends(get_db)):
-    post = db.get(Post, post_id)
+async def delete_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    # likes は cascade で一緒に消すので先に読んでおく
+    post = await db.get(Post, post_id, options=[selectinload(Post.likes)])
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    db.delete(post)
-    db.commit()
\ No newline at end of file
+    await db.delete(post)
+    await db.commit()
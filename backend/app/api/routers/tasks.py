@@ -1,9 +1,14 @@
+import json
 from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.core.config import settings
 from app.db.session import get_db
 from app.models.goal import Goal
 from app.models.task import Task, TaskType
@@ -14,20 +19,40 @@ from app.schemas.task import (
     BreakdownResponse,
     RevisionChatRequest,
     RevisionChatResponse,
+    TaskBatchRequest,
+    TaskBatchResponse,
     TaskBulkCreate,
     TaskCreate,
     TaskRead,
     TaskUpdate,
 )
+from app.schemas.revision_session import RevisionSessionRead, RevisionSessionStart, RevisionSessionTurn
 from app.api.deps import get_current_user
+from app.api.utils.conditional import make_etag, not_modified
+from app.api.utils.pagination import PageParams, page_params, paginate
 from app.models.user import User
+from app.services.ai_usage import check_free_limit, usage_scope
+from app.services.breakdown_jobs import submit_breakdown_job
+from app.services.breakdown_stream import stream_breakdown
+from app.services.revision_session import (
+    delete_revision_session,
+    get_revision_session,
+    run_revision_turn,
+    start_revision_session,
+    sync_session_draft,
+    to_session_read,
+)
 from app.services.task_service import (
-    build_breakdown,
+    coalesced_breakdown,
     compose_note_subtasks,
     derive_breakdown_scope,
     generate_revision_suggestions,
     parse_note_subtasks,
+    persist_breakdown_in_new_session,
 )
+from app.services.task_batch import apply_task_batch
+from app.services.task_lists import GOAL_TASK_ORDER, TASK_LIST_ORDER
+from app.services.task_writer import insert_tasks, update_tasks
 
 router = APIRouter(tags=["tasks"])
 
@@ -64,13 +89,15 @@ def _merge_or_move_daily_task(db: Session, task: Task, target_date: date) -> Tas
 
 
 @router.post("/goals/{goal_id}/tasks/breakdown", response_model=BreakdownResponse)
-def create_breakdown(
+async def create_breakdown(
     goal_id: int,
     payload: BreakdownRequest,
+    async_job: bool = Query(default=False, alias="async"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    goal = db.get(Goal, goal_id)
+    # Gemini 待ちでスレッドプールを占有しないよう async にし、DB 操作だけスレッドプールで行う
+    goal = await run_in_threadpool(db.get, Goal, goal_id)
     if not goal or goal.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Goal not found")
 
@@ -81,7 +108,25 @@ def create_breakdown(
     if goal.deadline:
         months, weeks_per_month, days_per_week, yearly_milestones = derive_breakdown_scope(goal.deadline)
 
-    breakdown = build_breakdown(
+    if async_job:
+        submitted = await submit_breakdown_job(
+            db,
+            goal,
+            current_user,
+            {
+                "months": months,
+                "weeks_per_month": weeks_per_month,
+                "days_per_week": days_per_week,
+                "yearly_milestones": yearly_milestones,
+                "current_situation": payload.current_situation,
+                "persist": payload.persist,
+                "replace_existing": True,
+            },
+        )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=submitted.model_dump())
+
+    # 同じ入力の同時リクエストは生成・保存を1回にまとめる
+    return await coalesced_breakdown(
         db,
         current_user,
         goal,
@@ -90,94 +135,166 @@ def create_breakdown(
         days_per_week,
         yearly_milestones=yearly_milestones,
         current_situation=payload.current_situation,
+        persist=payload.persist,
     )
-    if payload.persist:
-        # 同じ目標の再生成でタスク重複が増えないように既存を消してから再作成
-        db.execute(delete(Task).where(Task.goal_id == goal.id))
-        for item in breakdown.monthly + breakdown.weekly + breakdown.daily:
-            if item.type == TaskType.daily:
-                subtasks = parse_note_subtasks(item.note)
-                if subtasks:
-                    for subtask in subtasks:
-                        db.add(
-                            Task(
-                                goal_id=goal.id,
-                                user_id=goal.user_id,
-                                type=item.type,
-                                title=subtask,
-                                month=item.month,
-                                week_number=item.week_number,
-                                date=item.date,
-                                note=None,
-                            )
-                        )
-                    continue
-            db.add(
-                Task(
-                    goal_id=goal.id,
-                    user_id=goal.user_id,
-                    type=item.type,
-                    title=item.title,
-                    month=item.month,
-                    week_number=item.week_number,
-                    date=item.date,
-                    note=item.note,
-                )
-            )
-        db.commit()
-    return breakdown
+
+
+@router.post("/goals/{goal_id}/tasks/breakdown/stream")
+async def create_breakdown_stream(
+    goal_id: int,
+    payload: BreakdownRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    分解結果を NDJSON で逐次返す。1行1イベントで、event は
+    monthly / weekly / daily（項目確定ごと）、replace（補完で段ごと差し替え）、daily_detail（詳細TODO）、
+    done（最終結果）、persisted。同時リクエストで無料枠を使い切った場合は error で終わる。
+    """
+    goal = await run_in_threadpool(db.get, Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    months = payload.months
+    weeks_per_month = payload.weeks_per_month
+    days_per_week = payload.days_per_week
+    yearly_milestones = 0
+    if goal.deadline:
+        months, weeks_per_month, days_per_week, yearly_milestones = derive_breakdown_scope(goal.deadline)
+
+    # 上限超過はストリーム開始前に 403 で返す（回数は Gemini を呼ぶときに確保する）
+    await run_in_threadpool(check_free_limit, db, current_user)
+
+    async def events():
+        breakdown: BreakdownResponse | None = None
+        with usage_scope(current_user.id, current_user.is_premium):
+            async for event in stream_breakdown(
+                goal,
+                months,
+                weeks_per_month,
+                days_per_week,
+                yearly_milestones=yearly_milestones,
+                current_situation=payload.current_situation,
+            ):
+                if event["event"] == "done":
+                    breakdown = event["breakdown"]
+                yield json.dumps(jsonable_encoder(event), ensure_ascii=False) + "\n"
+        if payload.persist and breakdown is not None:
+            await run_in_threadpool(persist_breakdown_in_new_session, goal, breakdown)
+            yield json.dumps({"event": "persisted"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 @router.get("/goals/{goal_id}/tasks", response_model=list[TaskRead])
-def list_goal_tasks(goal_id: int, db: Session = Depends(get_db)):
+def list_goal_tasks(
+    goal_id: int,
+    response: Response,
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_db),
+):
     if not db.get(Goal, goal_id):
         raise HTTPException(status_code=404, detail="Goal not found")
-    stmt = select(Task).where(Task.goal_id == goal_id).order_by(Task.type, Task.date, Task.id)
-    return list(db.scalars(stmt))
+    return paginate(db, select(Task).where(Task.goal_id == goal_id), GOAL_TASK_ORDER, page, response)
 
 
 @router.post("/goals/{goal_id}/tasks/revision-chat", response_model=RevisionChatResponse)
-def revision_chat(goal_id: int, payload: RevisionChatRequest, db: Session = Depends(get_db)):
-    goal = db.get(Goal, goal_id)
+async def revision_chat(goal_id: int, payload: RevisionChatRequest, db: Session = Depends(get_db)):
+    goal = await run_in_threadpool(db.get, Goal, goal_id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
-    return generate_revision_suggestions(
-        goal_title=goal.title,
+    goal_title = goal.title
+    # Gemini を待つ間、接続をトランザクション中のまま持ち続けないようにプールへ返す
+    await run_in_threadpool(db.close)
+    return await generate_revision_suggestions(
+        goal_title=goal_title,
         message=payload.message,
         draft_tasks=payload.draft_tasks,
         chat_history=payload.chat_history,
     )
 
 
+@router.post(
+    "/goals/{goal_id}/tasks/revision-session",
+    response_model=RevisionSessionRead,
+    status_code=status.HTTP_201_CREATED,
+)
+def create_revision_session(
+    goal_id: int,
+    payload: RevisionSessionStart,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """ドラフト全体を1回だけ送ってセッションを開始する。以降のターンは差分とメッセージだけを送る。"""
+    goal = db.get(Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return to_session_read(start_revision_session(db, goal, current_user.id, payload.draft_tasks))
+
+
+@router.get("/goals/{goal_id}/tasks/revision-session", response_model=RevisionSessionRead)
+def read_revision_session(goal_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    goal = db.get(Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return to_session_read(get_revision_session(db, goal, current_user.id))
+
+
+@router.post("/goals/{goal_id}/tasks/revision-session/messages", response_model=RevisionChatResponse)
+async def revision_session_message(
+    goal_id: int,
+    payload: RevisionSessionTurn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    goal = await run_in_threadpool(db.get, Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    return await run_revision_turn(db, goal, current_user, payload)
+
+
+@router.delete("/goals/{goal_id}/tasks/revision-session", status_code=status.HTTP_204_NO_CONTENT)
+def end_revision_session(goal_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    goal = db.get(Goal, goal_id)
+    if not goal or goal.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    delete_revision_session(db, goal, current_user.id)
+    return None
+
+
 @router.post("/goals/{goal_id}/tasks/revisions/apply", response_model=ApplyRevisionsResponse)
 def apply_revisions(goal_id: int, payload: ApplyRevisionsRequest, db: Session = Depends(get_db)):
     if not db.get(Goal, goal_id):
         raise HTTPException(status_code=404, detail="Goal not found")
 
-    touched_ids: set[int] = set()
+    # 対象をまとめて1回で読み、変更はメモリ上で当ててから一括 UPDATE する
+    target_ids = {proposal.target_task_id for proposal in payload.accepted_proposals}
+    rows: dict[int, dict] = {}
+    if target_ids:
+        result = db.execute(
+            select(*Task.__table__.columns).where(Task.id.in_(target_ids), Task.goal_id == goal_id)
+        )
+        rows = {row["id"]: dict(row) for row in result.mappings()}
+
+    touched: dict[int, dict] = {}
     for proposal in payload.accepted_proposals:
-        task = db.get(Task, proposal.target_task_id)
-        if not task or task.goal_id != goal_id:
+        row = rows.get(proposal.target_task_id)
+        if row is None:
             continue
         if proposal.target_type == "subtask":
             if proposal.subtask_index is None:
                 continue
-            subtasks = parse_note_subtasks(task.note)
+            subtasks = parse_note_subtasks(row["note"])
             if proposal.subtask_index < 0 or proposal.subtask_index >= len(subtasks):
                 continue
             subtasks[proposal.subtask_index] = proposal.after
-            task.note = compose_note_subtasks(subtasks)
+            row["note"] = compose_note_subtasks(subtasks)
         else:
-            task.title = proposal.after
-        touched_ids.add(task.id)
+            row["title"] = proposal.after
+        touched[row["id"]] = row
 
-    db.commit()
-    updated_tasks: list[Task] = []
-    for task_id in touched_ids:
-        task = db.get(Task, task_id)
-        if task:
-            db.refresh(task)
-            updated_tasks.append(task)
+    updated_tasks = update_tasks(db, list(touched.values()), fields=("title", "note"))
+    sync_session_draft(db, goal_id, updated_tasks)
     return ApplyRevisionsResponse(updated_tasks=updated_tasks)
 
 
@@ -192,57 +309,56 @@ def create_task(payload: TaskCreate, db: Session = Depends(get_db)):
 
 @router.post("/tasks/bulk", response_model=list[TaskRead], status_code=status.HTTP_201_CREATED)
 def create_tasks_bulk(payload: TaskBulkCreate, db: Session = Depends(get_db)):
-    created: list[Task] = []
-    for raw in payload.tasks:
-        task = Task(**raw.model_dump())
-        db.add(task)
-        created.append(task)
-    db.commit()
-    for task in created:
-        db.refresh(task)
-    return created
+    # 1件ずつ add → refresh せず、INSERT ... RETURNING の結果をそのまま返す
+    return insert_tasks(db, [raw.model_dump() for raw in payload.tasks])
+
+
+@router.post("/tasks/batch", response_model=TaskBatchResponse)
+def batch_tasks(
+    payload: TaskBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    完了の切り替え・更新・持ち越し・削除を順番どおり1トランザクションで当てる（オフライン中の操作の再送用）。
+    結果は操作ごとに status_code で返す。
+    """
+    if len(payload.operations) > settings.TASK_BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Too many operations (max {settings.TASK_BATCH_MAX_OPERATIONS})")
+    return apply_task_batch(db, current_user.id, payload.operations, payload.atomic)
 
 
 @router.get("/tasks", response_model=list[TaskRead])
 def list_tasks(
     user_id: int,
     type: TaskType,
+    request: Request,
+    response: Response,
     month: int | None = None,
     week_number: int | None = None,
     date_value: date | None = Query(default=None, alias="date"),
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db),
 ):
-    # 日次一覧取得時に、未完了タスクを日付変更に追従させる（翌日へ持ち越し）
-    if type == TaskType.daily and date_value is not None:
-        overdue_tasks = list(
-            db.scalars(
-                select(Task).where(
-                    Task.user_id == user_id,
-                    Task.type == TaskType.daily,
-                    Task.is_done.is_(False),
-                    Task.date.is_not(None),
-                    Task.date < date_value,
-                )
-            )
-        )
-        for task in overdue_tasks:
-            # 1日ずつ持ち越す意図を保ちつつ、取得対象日より未来にはしない
-            next_date = task.date + timedelta(days=1)
-            _merge_or_move_daily_task(db, task, min(next_date, date_value))
-        if overdue_tasks:
-            db.commit()
-
-    stmt = select(Task).where(Task.user_id == user_id, Task.type == type)
+    # 読み取り専用。未完了タスクの持ち越しは日付が変わったときのバッチ（services/carry_over.py）で行う
+    conditions = [Task.user_id == user_id, Task.type == type]
     if type == TaskType.monthly and month is not None:
-        stmt = stmt.where(Task.month == month)
+        conditions.append(Task.month == month)
     if type == TaskType.weekly and week_number is not None:
-        stmt = stmt.where(Task.week_number == week_number)
+        conditions.append(Task.week_number == week_number)
     if type == TaskType.daily:
         if week_number is not None:
-            stmt = stmt.where(Task.week_number == week_number)
+            conditions.append(Task.week_number == week_number)
         if date_value is not None:
-            stmt = stmt.where(Task.date == date_value)
-    return list(db.scalars(stmt.order_by(Task.created_at.desc())))
+            conditions.append(Task.date == date_value)
+
+    # 件数と最終更新だけを先に見て、変わっていなければ一覧の取得とシリアライズを省く
+    count, last_modified = db.execute(select(func.count(), func.max(Task.updated_at)).where(*conditions)).one()
+    etag = make_etag("tasks", user_id, type, month, week_number, date_value, count, last_modified, page.cursor, page.limit)
+    cached = not_modified(request, response, etag, last_modified)
+    if cached:
+        return cached
+    return paginate(db, select(Task).where(*conditions), TASK_LIST_ORDER, page, response)
 
 
 @router.put("/tasks/{task_id}", response_model=TaskRead)
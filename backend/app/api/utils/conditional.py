@@ -0,0 +1,47 @@
+import datetime as dt
+import hashlib
+import json
+from email.utils import format_datetime
+
+from fastapi import Request, Response
+
+ETAG_HEADER = "ETag"
+
+
+def make_etag(*parts) -> str:
+    """スコープのバージョン（件数・最終更新など）とクエリ条件から弱い ETag を作る。"""
+    raw = json.dumps(parts, default=str, separators=(",", ":")).encode()
+    return f'W/"{hashlib.sha1(raw).hexdigest()}"'
+
+
+def _http_date(value: dt.datetime) -> str:
+    # DB には UTC の naive datetime で入っている
+    return format_datetime(value.replace(tzinfo=dt.timezone.utc, microsecond=0), usegmt=True)
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match は弱い比較
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def not_modified(
+    request: Request, response: Response, etag: str, last_modified: dt.datetime | None = None
+) -> Response | None:
+    """
+    検証子をレスポンスヘッダーに付け、If-None-Match が一致すれば 304 を返す（呼び出し側は本体の取得を省く）。
+    削除では最終更新日時が進まないので、判定は ETag だけで行い If-Modified-Since は見ない。
+    """
+    headers = {ETAG_HEADER: etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
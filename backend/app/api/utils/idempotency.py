@@ -0,0 +1,123 @@
+import hashlib
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.idempotency import IdempotencyConflict, IdempotencyStore, idempotency_store
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# 作成系と分解。ストリーミング（/tasks/breakdown/stream）はレスポンスを溜められないので対象外
+IDEMPOTENT_ROUTES = [
+    re.compile(pattern)
+    for pattern in (
+        r"/tasks",
+        r"/tasks/bulk",
+        r"/tasks/batch",
+        r"/goals",
+        r"/posts",
+        r"/goals/\d+/tasks/breakdown",
+    )
+]
+
+# 再送時に返すヘッダー。それ以外（Set-Cookie など）は保存しない
+_KEPT_HEADERS = {b"content-type", b"location"}
+
+
+def _principal(headers: Headers) -> str:
+    # キーはユーザーごとに分ける。トークンそのものは持たない
+    return hashlib.sha256(headers.get("authorization", "").encode()).hexdigest()[:16]
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """
+    IDEMPOTENT_ROUTES への POST に Idempotency-Key があれば、最初のレスポンスを保存してリトライには同じものを返す。
+    DB への書き込みや Gemini の呼び出しは繰り返さない。5xx と例外は保存しない（リトライで再実行する）。
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not any(route.fullmatch(scope["path"]) for route in IDEMPOTENT_ROUTES)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(IDEMPOTENCY_KEY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > 255:
+            await JSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(scope.get("query_string", b"") + b"\0" + body).hexdigest()
+        key = (scope["path"], _principal(headers), idempotency_key)
+        try:
+            stored = await self.store.begin(key, fingerprint, settings.IDEMPOTENCY_WAIT_SECONDS)
+        except IdempotencyConflict as e:
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code)(scope, receive, send)
+            return
+        if stored is not None:
+            response = Response(stored.body, status_code=stored.status_code)
+            response.raw_headers = [*stored.headers, (b"content-length", str(len(response.body)).encode())]
+            response.headers[REPLAYED_HEADER] = "true"
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            # 読み切った本文をアプリに渡し、その後は切断の検知などを元の receive に任せる
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        kept_headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        finished = False
+
+        async def capture_send(message: Message) -> None:
+            nonlocal status_code, kept_headers, finished
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                kept_headers = [(k, v) for k, v in message.get("headers", []) if k.lower() in _KEPT_HEADERS]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                finished = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.release(key)
+            raise
+        if finished and status_code < 500:
+            self.store.complete(key, status_code, kept_headers, b"".join(chunks))
+        else:
+            self.store.release(key)
@@ -0,0 +1,151 @@
+import base64
+import binascii
+import datetime as dt
+import json
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, and_, false, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, Session
+
+from app.core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True)
+class SortKey:
+    column: InstrumentedAttribute
+    descending: bool = False
+    # NULL は昇順・降順とも最後に並べる
+    nullable: bool = False
+
+
+@dataclass(frozen=True)
+class PageParams:
+    cursor: str | None
+    # None は全件（ページに分けない）
+    limit: int | None
+
+
+def page_params(
+    cursor: str | None = None,
+    limit: int | None = Query(default=None, ge=1, le=settings.PAGE_MAX_LIMIT),
+) -> PageParams:
+    """limit も cursor も無い既存クライアントには従来どおり全件返す。cursor だけなら PAGE_DEFAULT_LIMIT 件ずつ。"""
+    if limit is None and cursor:
+        limit = settings.PAGE_DEFAULT_LIMIT
+    return PageParams(cursor=cursor, limit=limit)
+
+
+def encode_cursor(values: list) -> str:
+    encoded = []
+    for value in values:
+        if isinstance(value, dt.datetime):
+            encoded.append({"t": value.isoformat()})
+        elif isinstance(value, dt.date):
+            encoded.append({"d": value.isoformat()})
+        elif hasattr(value, "value"):
+            encoded.append(value.value)
+        else:
+            encoded.append(value)
+    raw = json.dumps(encoded, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    invalid = HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        encoded = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise invalid
+    if not isinstance(encoded, list) or len(encoded) != size:
+        raise invalid
+    values = []
+    try:
+        for value in encoded:
+            if isinstance(value, dict) and "t" in value:
+                values.append(dt.datetime.fromisoformat(value["t"]))
+            elif isinstance(value, dict) and "d" in value:
+                values.append(dt.date.fromisoformat(value["d"]))
+            elif isinstance(value, dict):
+                raise invalid
+            else:
+                values.append(value)
+    except (TypeError, ValueError):
+        raise invalid
+    return values
+
+
+def _after(key: SortKey, value):
+    """並び順で value より後ろにある行の条件。"""
+    column = key.column
+    if value is None:
+        # NULL は末尾なので、NULL より後ろは同じキーの中にしかない
+        return None
+    beyond = column < value if key.descending else column > value
+    return or_(beyond, column.is_(None)) if key.nullable else beyond
+
+
+def _equal(key: SortKey, value):
+    return key.column.is_(None) if value is None else key.column == value
+
+
+def keyset_filter(keys: list[SortKey], values: list):
+    """(k1, k2, ...) の並びで values より後ろの行。向きの混在と NULL に対応するため OR で展開する。"""
+    clauses = []
+    for i, key in enumerate(keys):
+        after = _after(key, values[i])
+        if after is None:
+            continue
+        clauses.append(and_(*[_equal(keys[j], values[j]) for j in range(i)], after))
+    return or_(*clauses) if clauses else false()
+
+
+def _order_by(keys: list[SortKey]) -> list:
+    order = []
+    for key in keys:
+        clause = key.column.desc() if key.descending else key.column.asc()
+        order.append(clause.nulls_last() if key.nullable else clause)
+    return order
+
+
+def page_query(stmt: Select, keys: list[SortKey], page: PageParams) -> Select:
+    """keys の並びで cursor の続きから limit + 1 件を読むクエリ。limit が None なら全件。"""
+    if page.cursor:
+        stmt = stmt.where(keyset_filter(keys, decode_cursor(page.cursor, len(keys))))
+    stmt = stmt.order_by(*_order_by(keys))
+    return stmt if page.limit is None else stmt.limit(page.limit + 1)
+
+
+def paginate(db: Session, stmt: Select, keys: list[SortKey], page: PageParams, response: Response) -> list:
+    """
+    キーセットページネーション。limit + 1 件だけ読み、続きがあれば最後の行のキーを X-Next-Cursor に入れる。
+    keys の最後は一意な列（id）にして、並びが安定するようにする。
+    """
+    rows = list(db.scalars(page_query(stmt, keys, page)))
+    return _finish_page(rows, keys, page, response)
+
+
+async def paginate_async(
+    db: AsyncSession, stmt: Select, keys: list[SortKey], page: PageParams, response: Response
+) -> list:
+    rows = list(await db.scalars(page_query(stmt, keys, page)))
+    return _finish_page(rows, keys, page, response)
+
+
+def split_page(rows: list, keys: list[SortKey], page: PageParams) -> tuple[list, str | None]:
+    """page_query の結果を (このページの行, 次のカーソル) に分ける。"""
+    if page.limit is None or len(rows) <= page.limit:
+        return rows, None
+    rows = rows[: page.limit]
+    return rows, encode_cursor([getattr(rows[-1], key.column.key) for key in keys])
+
+
+def _finish_page(rows: list, keys: list[SortKey], page: PageParams, response: Response) -> list:
+    rows, next_cursor = split_page(rows, keys, page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
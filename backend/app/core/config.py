@@ -15,6 +15,61 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     GEMINI_API_KEY: Optional[str] = None
     GEMINI_MODEL: str = "gemini-1.5-flash"
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com"
+    GEMINI_TIMEOUT_SECONDS: float = 90.0
+    GEMINI_HTTP2: bool = True
+    GEMINI_MAX_CONNECTIONS: int = 20
+    GEMINI_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GEMINI_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    GEMINI_ENDPOINT_TTL_SECONDS: float = 1800.0
+    GEMINI_TOTAL_DEADLINE_SECONDS: float = 60.0
+    GEMINI_HEDGE_DELAY_SECONDS: float = 8.0
+    GEMINI_BREAKER_WINDOW_SECONDS: float = 60.0
+    GEMINI_BREAKER_MIN_CALLS: int = 10
+    GEMINI_BREAKER_FAILURE_RATE: float = 0.5
+    GEMINI_BREAKER_SLOW_CALL_SECONDS: float = 30.0
+    GEMINI_BREAKER_SLOW_RATE: float = 0.8
+    GEMINI_BREAKER_OPEN_SECONDS: float = 30.0
+    GEMINI_BREAKER_HALF_OPEN_TRIALS: int = 3
+    BREAKDOWN_CACHE_MAX_ENTRIES: int = 512
+    BREAKDOWN_CACHE_TTL_SECONDS: float = 3600.0
+    IDEMPOTENCY_MAX_ENTRIES: int = 2048
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0
+    # これより大きいレスポンスは保存しない（zlib 圧縮後）
+    IDEMPOTENCY_MAX_BODY_BYTES: int = 256 * 1024
+    # 同じキーの先行リクエストを待つ上限。分解は Gemini を待つので長めにする
+    IDEMPOTENCY_WAIT_SECONDS: float = 180.0
+    BREAKDOWN_JOB_WORKERS: int = 4
+    BREAKDOWN_JOB_MAX_QUEUED: int = 100
+    BREAKDOWN_JOB_MAX_ATTEMPTS: int = 3
+    BREAKDOWN_JOB_STALE_SECONDS: float = 300.0
+    BREAKDOWN_JOB_PROGRESS_INTERVAL_SECONDS: float = 1.0
+    BREAKDOWN_JOB_RECOVERY_INTERVAL_SECONDS: float = 60.0
+    TASK_INSERT_BATCH_SIZE: int = 500
+    TASK_BATCH_MAX_OPERATIONS: int = 500
+    CARRY_OVER_TIMEZONE: str = "Asia/Tokyo"
+    CARRY_OVER_DELAY_SECONDS: float = 60.0
+    PAGE_DEFAULT_LIMIT: int = 200
+    PAGE_MAX_LIMIT: int = 1000
+    # async 側はスレッドプールに縛られないので、同時実行数の上限は実質このプールになる
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 20
+    REVISION_HISTORY_TOKEN_BUDGET: int = 1500
+    FREE_DAILY_BREAKDOWN_LIMIT: int = 3
+    AI_MAX_CONCURRENT_CALLS: int = 16
+    AI_PER_USER_CONCURRENT_CALLS: int = 4
+    AI_PREMIUM_WEIGHT: float = 4.0
+    AI_FREE_WEIGHT: float = 1.0
+    AI_ADMISSION_TIMEOUT_SECONDS: float = 10.0
+    AI_USAGE_FLUSH_INTERVAL_SECONDS: float = 2.0
+    AI_USAGE_MAX_BUFFER: int = 5000
+    REVISION_SHARD_THRESHOLD: int = 20
+    REVISION_SHARD_TARGET_TASKS: int = 8
+    REVISION_SHARD_CONCURRENCY: int = 4
+    REVISION_SUMMARY_MAX_CHARS: int = 800
+    # /diagnostics は有効にしたときだけ登録し、ここに挙げたメールアドレスのユーザーにだけ返す（カンマ区切り）
+    DIAGNOSTICS_ENABLED: bool = False
+    DIAGNOSTICS_ADMIN_EMAILS: str = ""
     
     STRIPE_API_KEY: Optional[str] = None
     STRIPE_WEBHOOK_SECRET: Optional[str] = None
@@ -0,0 +1,80 @@
+"""
+よく使う検索条件向けの複合・部分インデックス（モデルの __table_args__ で定義したもの）。
+既存の DB にはマイグレーション 0002 で作る。
+
+    python -m app.db.indexes            # 本番向けの DDL を表示（CREATE INDEX CONCURRENTLY）
+    python -m app.db.indexes --apply    # 不足分をこの場で作成
+"""
+
+import argparse
+
+from sqlalchemy import Index, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+
+from app.db.base import Base
+import app.models  # noqa: F401  テーブル定義を Base.metadata に登録する
+
+# 追加・変更したら上げる
+INDEX_PACK_VERSION = 1
+
+HOT_INDEXES = (
+    ("tasks", "ix_tasks_user_type_date"),
+    ("tasks", "ix_tasks_user_type_week"),
+    ("tasks", "ix_tasks_goal_type_date"),
+    ("tasks", "ix_tasks_open_daily_user_date"),
+    ("posts", "ix_posts_week_user_created"),
+    ("friendships", "ix_friendships_friend_status"),
+)
+
+
+def hot_indexes() -> list[Index]:
+    indexes = []
+    for table_name, index_name in HOT_INDEXES:
+        table = Base.metadata.tables[table_name]
+        indexes.append(next(index for index in table.indexes if index.name == index_name))
+    return indexes
+
+
+def ensure_indexes(bind: Engine | Connection) -> list[str]:
+    """存在しないものだけ作成し、作成したインデックス名を返す。"""
+    inspector = inspect(bind)
+    existing: dict[str, set[str]] = {}
+    created = []
+    for index in hot_indexes():
+        table_name = index.table.name
+        if table_name not in existing:
+            existing[table_name] = {i["name"] for i in inspector.get_indexes(table_name)}
+        if index.name not in existing[table_name]:
+            index.create(bind)
+            created.append(index.name)
+    return created
+
+
+def index_pack_ddl(dialect) -> list[str]:
+    """運用で手動適用する用。PostgreSQL では書き込みを止めないよう CONCURRENTLY を付ける。"""
+    statements = []
+    for index in hot_indexes():
+        sql = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+        if dialect.name == "postgresql":
+            sql = sql.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        statements.append(sql.strip() + ";")
+    return statements
+
+
+def main() -> None:
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description=f"Hot-query index pack v{INDEX_PACK_VERSION}")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes now")
+    args = parser.parse_args()
+    if args.apply:
+        print(ensure_indexes(engine))
+        return
+    print(f"-- index pack v{INDEX_PACK_VERSION}")
+    for statement in index_pack_ddl(engine.dialect):
+        print(statement)
+
+
+if __name__ == "__main__":
+    main()
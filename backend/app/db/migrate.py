@@ -0,0 +1,120 @@
+"""
+マイグレーションの実行。デプロイ時に1回だけ実行する（アプリの起動時はバージョンの確認だけ）。
+
+    python -m app.db.migrate            # 未適用のものを順に適用
+    python -m app.db.migrate --status   # 現在のバージョンを表示
+
+PostgreSQL ではアドバイザリロックを取ってから実行するので、複数台から同時に実行しても1回しか適用されない。
+"""
+
+import argparse
+import datetime as dt
+import logging
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.migrations import LATEST_VERSION, MIGRATIONS
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock のキー（"STRK"）
+MIGRATION_LOCK_KEY = 0x5354524B
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.scalar(select(func.coalesce(func.max(schema_version.c.version), 0)))
+
+
+def _lock(conn: Connection) -> None:
+    # SQLite は書き込み時にファイル全体がロックされるので何もしない
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_lock({MIGRATION_LOCK_KEY})")
+        conn.commit()
+
+
+def _unlock(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_unlock({MIGRATION_LOCK_KEY})")
+        conn.commit()
+
+
+def migrate(engine: Engine) -> list[int]:
+    """未適用のマイグレーションを順に適用し、適用したバージョンを返す。"""
+    applied = []
+    # ロックはセッション単位なので、専用の接続で最後まで持ち続ける
+    with engine.connect() as lock_conn:
+        _lock(lock_conn)
+        try:
+            with engine.begin() as conn:
+                schema_version.create(conn, checkfirst=True)
+            with engine.connect() as conn:
+                version = current_version(conn)
+            for migration in MIGRATIONS:
+                if migration.version <= version:
+                    continue
+                logger.info("Applying migration %04d_%s", migration.version, migration.name)
+                if migration.transactional:
+                    with engine.begin() as conn:
+                        migration.upgrade(conn)
+                        _record(conn, migration.version, migration.name)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                        migration.upgrade(conn)
+                    with engine.begin() as conn:
+                        _record(conn, migration.version, migration.name)
+                applied.append(migration.version)
+        finally:
+            _unlock(lock_conn)
+    return applied
+
+
+def _record(conn: Connection, version: int, name: str) -> None:
+    conn.execute(insert(schema_version).values(version=version, name=name, applied_at=dt.datetime.utcnow()))
+
+
+def check_schema_version(engine: Engine) -> int:
+    """起動時の確認。1クエリで済ませ、DDL は実行しない。"""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version}, but this build needs {LATEST_VERSION}. "
+            "Run `python -m app.db.migrate` before starting the app."
+        )
+    if version > LATEST_VERSION:
+        logger.warning("Database schema version %d is newer than this build (%d)", version, LATEST_VERSION)
+    return version
+
+
+def main() -> None:
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--status", action="store_true", help="print the current schema version and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.status:
+        with engine.connect() as conn:
+            print(f"schema version {current_version(conn)} (latest {LATEST_VERSION})")
+        return
+    applied = migrate(engine)
+    print(f"applied {applied}" if applied else f"schema is up to date (version {LATEST_VERSION})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+スキーマのマイグレーション。番号順に1回ずつ適用し、適用済みの番号は schema_version に記録する。
+追加するときは vNNNN_*.py を作って MIGRATIONS の末尾に足す（既存のものは書き換えない）。
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy.engine import Connection
+
+from app.db.migrations import v0001_baseline, v0002_hot_indexes, v0003_post_updated_at
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    # False のものはトランザクション外（AUTOCOMMIT）で実行する（CREATE INDEX CONCURRENTLY など）
+    transactional: bool = True
+
+
+MIGRATIONS = [
+    Migration(1, "baseline", v0001_baseline.upgrade),
+    Migration(2, "hot_indexes", v0002_hot_indexes.upgrade, transactional=False),
+    Migration(3, "post_updated_at", v0003_post_updated_at.upgrade),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
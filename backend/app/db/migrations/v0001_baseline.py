@@ -0,0 +1,38 @@
+"""
+これまで起動時（main.on_startup）と fix_db.py で行っていた処理をまとめた基準点。
+既存の DB に当てても壊さないよう、足りないテーブルとカラムだけを作る。
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+import app.models  # noqa: F401  テーブル定義を Base.metadata に登録する
+from app.db.base import Base
+
+# create_all より前に作られたテーブルに後から足したカラム: (テーブル, カラム, DEFAULT)
+ADDED_COLUMNS = [
+    ("users", "avatar_url", None),
+    ("users", "avatar_data", None),
+    ("users", "avatar_content_type", None),
+    ("users", "is_premium", "FALSE"),
+    ("users", "is_verified", "FALSE"),
+    ("users", "verification_token", None),
+    ("goals", "current_situation", None),
+]
+
+
+def upgrade(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+
+    inspector = inspect(conn)
+    existing: dict[str, set[str]] = {}
+    for table_name, column_name, default in ADDED_COLUMNS:
+        if table_name not in existing:
+            existing[table_name] = {col["name"] for col in inspector.get_columns(table_name)}
+        if column_name in existing[table_name]:
+            continue
+        column_type = Base.metadata.tables[table_name].c[column_name].type.compile(dialect=conn.dialect)
+        ddl = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"
+        if default is not None:
+            ddl += f" DEFAULT {default}"
+        conn.execute(text(ddl))
@@ -0,0 +1,26 @@
+"""
+検索の多いクエリ向けの複合・部分インデックス（app/db/indexes.py の index pack v1）。
+PostgreSQL では書き込みを止めないよう CREATE INDEX CONCURRENTLY で作る（そのためトランザクション外で実行する）。
+"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.indexes import ensure_indexes, hot_indexes, index_pack_ddl
+
+
+def upgrade(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        ensure_indexes(conn)
+        return
+    # 途中で失敗した CONCURRENTLY は INVALID のインデックスを残し、IF NOT EXISTS で飛ばされてしまうので消しておく
+    invalid = set(
+        conn.scalars(
+            text("SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid")
+        )
+    )
+    for index in hot_indexes():
+        if index.name in invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+    for statement in index_pack_ddl(conn.dialect):
+        conn.execute(text(statement))
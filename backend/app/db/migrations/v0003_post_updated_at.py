@@ -0,0 +1,14 @@
+"""
+posts に updated_at を追加する（一覧の ETag で編集やいいねの変化を検知するため）。
+baseline で新しく作ったテーブルには既にあるので、無いときだけ足す。
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(conn: Connection) -> None:
+    columns = {col["name"] for col in inspect(conn).get_columns("posts")}
+    if "updated_at" not in columns:
+        conn.execute(text("ALTER TABLE posts ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text("UPDATE posts SET updated_at = created_at WHERE updated_at IS NULL"))
@@ -2,14 +2,20 @@ import os
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import inspect, text
 from starlette.staticfiles import StaticFiles
 
 from app.api.router import api_router
+from app.api.utils.conditional import ETAG_HEADER
+from app.api.utils.idempotency import REPLAYED_HEADER, IdempotencyMiddleware
+from app.api.utils.pagination import NEXT_CURSOR_HEADER
 from app.core.config import settings
-from app.db.base import Base
-from app.db.session import engine
+from app.db.migrate import check_schema_version
+from app.db.session import async_engine, engine
 from app.models import *
+from app.services.ai_usage import usage_recorder
+from app.services.breakdown_jobs import breakdown_job_runner
+from app.services.carry_over import carry_over_scheduler
+from app.services.gemini_client import close_gemini_client, start_gemini_client
 
 # パスの設定 (EC2の権限エラー回避)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -19,39 +25,36 @@ uploads_dir.mkdir(parents=True, exist_ok=True)
 app = FastAPI(title=settings.APP_NAME)
 app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
 
+# CORS より内側に置き、再送したレスポンスにも CORS ヘッダーが付くようにする
+app.add_middleware(IdempotencyMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origin_regex=".*",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, REPLAYED_HEADER],
 )
 
 @app.on_event("startup")
 def on_startup():
-    # テーブルの作成
-    Base.metadata.create_all(bind=engine)
-    
-    # 自動カラム追加ロジック
-    with engine.begin() as conn:
-        inspector = inspect(conn)
-        columns = {col["name"] for col in inspector.get_columns("users")}
-        
-        required_columns = [
-            ("avatar_url", "VARCHAR(255)"),
-            ("avatar_data", "BYTEA"),
-            ("avatar_content_type", "VARCHAR(64)"),
-            ("is_premium", "BOOLEAN DEFAULT FALSE"),
-            ("is_verified", "BOOLEAN DEFAULT FALSE"),
-            ("verification_token", "VARCHAR(255)"),
-        ]
-        
-        for col_name, col_type in required_columns:
-            if col_name not in columns:
-                try:
-                    conn.execute(text(f"ALTER TABLE users ADD COLUMN {col_name} {col_type}"))
-                except Exception as e:
-                    print(f"Error adding {col_name}: {e}")
+    # スキーマの変更はデプロイ時の python -m app.db.migrate で行い、ここではバージョンの確認だけする
+    check_schema_version(engine)
+
+@app.on_event("startup")
+async def start_background_services():
+    await start_gemini_client()
+    await usage_recorder.start()
+    await breakdown_job_runner.start()
+    await carry_over_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await carry_over_scheduler.stop()
+    await breakdown_job_runner.stop()
+    await usage_recorder.stop()
+    await close_gemini_client()
+    await async_engine.dispose()
 
 @app.get("/health")
 def health_check():
@@ -1,16 +1,23 @@
+from app.models.ai_usage import AIUsageDaily, AIUsageEvent
+from app.models.breakdown_job import BreakdownJob
 from app.models.friendship import Friendship
 from app.models.goal import Goal
 from app.models.group import Group, GroupMember
 from app.models.post import Post
+from app.models.revision_session import RevisionSession
 from app.models.task import Task, TaskType
 from app.models.user import User, UserSetting
 
 __all__ = [
+    "AIUsageDaily",
+    "AIUsageEvent",
+    "BreakdownJob",
     "Friendship",
     "Goal",
     "Group",
     "GroupMember",
     "Post",
+    "RevisionSession",
     "Task",
     "TaskType",
     "User",
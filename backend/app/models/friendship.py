@@ -1,11 +1,15 @@
 from datetime import datetime
-from sqlalchemy import DateTime, ForeignKey, UniqueConstraint, String
+from sqlalchemy import DateTime, ForeignKey, Index, UniqueConstraint, String
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
 class Friendship(Base):
     __tablename__ = "friendships"
-    __table_args__ = (UniqueConstraint("user_id", "friend_id", name="uq_friend_pair"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "friend_id", name="uq_friend_pair"),
+        # 受け取った申請・承認済みフレンドの取得（user_id 側は uq_friend_pair で引ける）
+        Index("ix_friendships_friend_status", "friend_id", "status"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 
@@ -14,6 +14,8 @@ class PostLike(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    # 週ごとのフィード（week_number + 表示対象ユーザー、created_at の降順）
+    __table_args__ = (Index("ix_posts_week_user_created", "week_number", "user_id", "created_at"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
@@ -23,6 +25,10 @@ class Post(Base):
     comment: Mapped[str] = mapped_column(String(500))
     achieved: Mapped[float] = mapped_column(Float)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # 編集といいねの増減で進める（一覧の ETag 用）
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     user = relationship("User")
     likes = relationship("PostLike", cascade="all, delete-orphan")
\ No newline at end of file
@@ -1,7 +1,7 @@
 import enum
 from datetime import date, datetime
 
-from sqlalchemy import Boolean, Date, DateTime, Enum, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Date, DateTime, Enum, ForeignKey, Index, Integer, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -23,6 +23,22 @@ class TaskStatus(str, enum.Enum):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # 日次一覧・週次一覧・週の集計（tasks.py / analytics.py）
+        Index("ix_tasks_user_type_date", "user_id", "type", "date"),
+        Index("ix_tasks_user_type_week", "user_id", "type", "week_number"),
+        # 目標ごとのタスク一覧（type, date 順）
+        Index("ix_tasks_goal_type_date", "goal_id", "type", "date"),
+        # 持ち越し対象（未完了の日次）だけを載せた部分インデックス。
+        # クエリ側も is_done = false で書く（IS false だとプランナーが述語を一致とみなさない）
+        Index(
+            "ix_tasks_open_daily_user_date",
+            "user_id",
+            "date",
+            postgresql_where=text("type = 'daily' AND is_done = false"),
+            sqlite_where=text("type = 'daily' AND is_done = 0"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     goal_id: Mapped[int | None] = mapped_column(
@@ -0,0 +1,30 @@
+import datetime as dt
+
+from pydantic import BaseModel
+
+
+class AIUsageDay(BaseModel):
+    day: dt.date
+    breakdowns: int
+    calls: int
+    failed_calls: int
+    prompt_tokens: int
+    output_tokens: int
+    avg_latency_ms: float | None = None
+
+
+class AIUsageReport(BaseModel):
+    breakdown_limit: int | None = None
+    breakdowns_today: int
+    days: list[AIUsageDay]
+
+
+class AILatencyItem(BaseModel):
+    kind: str
+    model: str
+    calls: int
+    failed_calls: int
+    p50_ms: int
+    p95_ms: int
+    p99_ms: int
+    max_ms: int
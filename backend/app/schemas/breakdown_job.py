@@ -0,0 +1,28 @@
+import datetime as dt
+
+from pydantic import BaseModel
+
+from app.schemas.task import BreakdownResponse
+
+
+class BreakdownJobSubmitted(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class BreakdownJobRead(BaseModel):
+    id: str
+    goal_id: int
+    status: str
+    partial: dict | None = None
+    result: BreakdownResponse | None = None
+    error: str | None = None
+    attempts: int
+    created_at: dt.datetime
+    started_at: dt.datetime | None = None
+    finished_at: dt.datetime | None = None
+    queue_wait_ms: int | None = None
+    run_ms: int | None = None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,20 @@
+import datetime as dt
+
+from pydantic import BaseModel
+
+from app.schemas.post import PostRead
+from app.schemas.ranking import RankingItem
+from app.schemas.task import TaskRead
+
+
+class TodayDashboard(BaseModel):
+    date: dt.date
+    week_number: int
+    month: int
+    daily_tasks: list[TaskRead]
+    weekly_tasks: list[TaskRead]
+    monthly_tasks: list[TaskRead]
+    ranking: list[RankingItem]
+    posts: list[PostRead]
+    # 続きは GET /posts?week=...&cursor=... で取る
+    posts_next_cursor: str | None = None
@@ -0,0 +1,40 @@
+import datetime as dt
+
+from pydantic import BaseModel
+
+from app.schemas.task import TaskRead
+
+
+class PlanTask(TaskRead):
+    subtasks: list[str] = []
+
+
+class PlanDay(BaseModel):
+    date: dt.date
+    tasks: list[PlanTask] = []
+
+
+class PlanWeek(BaseModel):
+    week_number: int
+    # 週次タスク
+    tasks: list[PlanTask] = []
+    days: list[PlanDay] = []
+
+
+class PlanMonth(BaseModel):
+    month: int | None
+    # 月次タスク
+    tasks: list[PlanTask] = []
+    weeks: list[PlanWeek] = []
+
+
+class GoalPlan(BaseModel):
+    goal_id: int
+    start: dt.date | None = None
+    end: dt.date | None = None
+    task_count: int
+    # 月の決まっていない月次タスク（年ごとのマイルストーン）
+    milestones: list[PlanTask] = []
+    months: list[PlanMonth] = []
+    # 日付も週もない日次タスク、週番号のない週次タスク
+    unscheduled: list[PlanTask] = []
@@ -0,0 +1,25 @@
+import datetime as dt
+
+from pydantic import BaseModel
+
+from app.schemas.task import DraftTask
+
+
+class RevisionSessionStart(BaseModel):
+    draft_tasks: list[DraftTask]
+
+
+class RevisionSessionTurn(BaseModel):
+    message: str
+    # 前回以降にクライアント側で変わったタスクだけを送る
+    upserted_tasks: list[DraftTask] = []
+    removed_task_ids: list[int] = []
+
+
+class RevisionSessionRead(BaseModel):
+    goal_id: int
+    task_count: int
+    history_turns: int
+    summary: str | None = None
+    version: int
+    updated_at: dt.datetime
@@ -107,4 +107,31 @@ class ApplyRevisionsRequest(BaseModel):
     accepted_proposals: list[TaskRevisionProposal]
 
 class ApplyRevisionsResponse(BaseModel):
-    updated_tasks: list[TaskRead]
\ No newline at end of file
+    updated_tasks: list[TaskRead]
+
+class TaskBatchOperation(BaseModel):
+    op: Literal["toggle", "update", "carry_over", "delete"]
+    task_id: int
+    # op が update のときだけ使う
+    changes: TaskUpdate | None = None
+
+class TaskBatchRequest(BaseModel):
+    operations: list[TaskBatchOperation]
+    # true なら1件でも失敗したら全体をロールバックする
+    atomic: bool = False
+
+class TaskBatchResult(BaseModel):
+    index: int
+    op: str
+    task_id: int
+    status_code: int
+    detail: str | None = None
+    # 操作後のタスク（持ち越しで統合された場合は統合先、削除なら None）
+    result_task_id: int | None = None
+
+class TaskBatchResponse(BaseModel):
+    committed: bool
+    results: list[TaskBatchResult]
+    # バッチ後の状態。操作したタスク（統合先を含む）のうち残っているもの
+    tasks: list[TaskRead]
+    deleted_ids: list[int]
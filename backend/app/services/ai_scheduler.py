@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+
+PREMIUM = "premium"
+FREE = "free"
+
+
+class AdmissionRejected(TimeoutError):
+    pass
+
+
+@dataclass
+class _Waiter:
+    user_id: int | None
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class AdmissionScheduler:
+    """
+    Gemini 呼び出しの受付制御。全体の同時実行数と1ユーザーあたりの同時実行数を制限し、
+    空きを待つ呼び出しはプランごとのキューに並べて重み付きで公平に取り出す（ストライドスケジューリング）。
+    timeout 内に受け付けられなければ AdmissionRejected を送出し、呼び出し側のフォールバックに任せる。
+    """
+
+    def __init__(self, max_concurrent: int, per_user_limit: int, weights: dict[str, float]):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.weights = weights
+        self.in_flight = 0
+        self._per_user: dict[int, int] = {}
+        self._queues: dict[str, deque[_Waiter]] = {tier: deque() for tier in weights}
+        self._pass: dict[str, float] = {tier: 0.0 for tier in weights}
+        self._admitted = {tier: 0 for tier in weights}
+        self._rejected = {tier: 0 for tier in weights}
+        self._waits: dict[str, deque[float]] = {tier: deque(maxlen=1000) for tier in weights}
+
+    def _user_has_room(self, user_id: int | None) -> bool:
+        return user_id is None or self._per_user.get(user_id, 0) < self.per_user_limit
+
+    def _acquire(self, user_id: int | None) -> None:
+        self.in_flight += 1
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+    def _release(self, user_id: int | None) -> None:
+        self.in_flight -= 1
+        if user_id is not None:
+            remaining = self._per_user.get(user_id, 1) - 1
+            if remaining > 0:
+                self._per_user[user_id] = remaining
+            else:
+                self._per_user.pop(user_id, None)
+        self._dispatch()
+
+    def _next_waiter(self) -> tuple[str, _Waiter] | None:
+        # pass が小さい（＝重みに対してまだ処理していない）プランから、上限に達していないユーザーの先頭を選ぶ
+        for tier in sorted((t for t, q in self._queues.items() if q), key=lambda t: self._pass[t]):
+            for waiter in self._queues[tier]:
+                if self._user_has_room(waiter.user_id):
+                    return tier, waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_concurrent:
+            picked = self._next_waiter()
+            if picked is None:
+                break
+            tier, waiter = picked
+            self._queues[tier].remove(waiter)
+            self._pass[tier] += 1.0 / self.weights[tier]
+            self._acquire(waiter.user_id)
+            waiter.future.set_result(None)
+        if not any(self._queues.values()):
+            for tier in self._pass:
+                self._pass[tier] = 0.0
+
+    def _enqueue(self, tier: str, user_id: int | None) -> _Waiter:
+        queue = self._queues[tier]
+        if not queue:
+            # しばらく空だったプランが溜め込んだ分で他を追い越さないよう、待っているプランの最小値にそろえる
+            active = [self._pass[t] for t, q in self._queues.items() if q]
+            if active:
+                self._pass[tier] = max(self._pass[tier], min(active))
+        waiter = _Waiter(user_id, asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        return waiter
+
+    @asynccontextmanager
+    async def admit(self, user_id: int | None, tier: str, timeout: float):
+        """受け付けられるまで待ち、待ち時間（秒）を返す。抜けるときに枠を返す。"""
+        started = time.monotonic()
+        waiting = any(self._queues.values())
+        if not waiting and self.in_flight < self.max_concurrent and self._user_has_room(user_id):
+            self._acquire(user_id)
+        else:
+            waiter = self._enqueue(tier, user_id)
+            self._dispatch()
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max(0.0, timeout))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # 期限と同時に受け付けられていた場合は枠を返す
+                    self._release(user_id)
+                else:
+                    waiter.future.cancel()
+                    if waiter in self._queues[tier]:
+                        self._queues[tier].remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._rejected[tier] += 1
+                    raise AdmissionRejected(f"AI request was not admitted within {timeout:.1f}s") from None
+                raise
+
+        wait = time.monotonic() - started
+        self._admitted[tier] += 1
+        self._waits[tier].append(wait)
+        try:
+            yield wait
+        finally:
+            self._release(user_id)
+
+    def stats(self) -> dict:
+        tiers = {}
+        for tier in self.weights:
+            waits = sorted(self._waits[tier])
+
+            def pct(p: float) -> float | None:
+                if not waits:
+                    return None
+                return round(waits[min(len(waits) - 1, int(p / 100 * len(waits)))] * 1000, 1)
+
+            tiers[tier] = {
+                "weight": self.weights[tier],
+                "queued": len(self._queues[tier]),
+                "admitted": self._admitted[tier],
+                "rejected": self._rejected[tier],
+                "wait_p50_ms": pct(50),
+                "wait_p95_ms": pct(95),
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else None,
+            }
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "per_user_limit": self.per_user_limit,
+            "tiers": tiers,
+        }
+
+
+ai_scheduler = AdmissionScheduler(
+    max_concurrent=settings.AI_MAX_CONCURRENT_CALLS,
+    per_user_limit=settings.AI_PER_USER_CONCURRENT_CALLS,
+    weights={PREMIUM: settings.AI_PREMIUM_WEIGHT, FREE: settings.AI_FREE_WEIGHT},
+)
@@ -0,0 +1,198 @@
+import asyncio
+import datetime as dt
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.ai_usage import AIUsageDaily, AIUsageEvent
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# (user_id, is_premium)
+_caller: ContextVar[tuple[int | None, bool]] = ContextVar("ai_caller", default=(None, False))
+
+
+@contextmanager
+def usage_scope(user_id: int | None, premium: bool = False):
+    """この中で行う Gemini 呼び出しを user_id の利用として記録し、スケジューラの優先度にも使う。"""
+    token = _caller.set((user_id, premium))
+    try:
+        yield
+    finally:
+        try:
+            _caller.reset(token)
+        except ValueError:
+            # 非同期ジェネレータが別コンテキストで閉じられた場合は戻す必要がない
+            pass
+
+
+def current_caller() -> tuple[int | None, bool]:
+    return _caller.get()
+
+
+def _dialect_insert(db: Session):
+    # 本番は PostgreSQL、ローカル検証用に SQLite の ON CONFLICT にも対応しておく
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def check_free_limit(db: Session, current_user: User) -> None:
+    """受付時の確認だけを行う（数えない）。回数は実際に Gemini を呼ぶときに reserve_free_breakdown で確保する。"""
+    if getattr(current_user, "is_premium", False):
+        return
+    used = db.scalar(
+        select(AIUsageDaily.breakdowns).where(AIUsageDaily.user_id == current_user.id, AIUsageDaily.day == dt.date.today())
+    )
+    if (used or 0) >= settings.FREE_DAILY_BREAKDOWN_LIMIT:
+        raise HTTPException(status_code=403, detail="FREE_LIMIT_REACHED")
+
+
+def reserve_free_breakdown(user_id: int | None, premium: bool) -> dt.date | None:
+    """
+    無料ユーザーの分解1回分を (user_id, day) の1行に確保し、確保した日を返す。上限未満のときだけ加算する
+    条件付き upsert なので、同時リクエストでも上限を超えない。プレミアム（と呼び出し元不明）は数えない。
+    キャッシュやフォールバックで返す分は数えないよう、Gemini を呼ぶ直前に呼ぶ。
+    """
+    if premium or user_id is None:
+        return None
+    day = dt.date.today()
+    with SessionLocal() as db:
+        insert_stmt = _dialect_insert(db)(AIUsageDaily).values(user_id=user_id, day=day, breakdowns=1)
+        stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[AIUsageDaily.user_id, AIUsageDaily.day],
+            set_={"breakdowns": AIUsageDaily.breakdowns + 1},
+            where=AIUsageDaily.breakdowns < settings.FREE_DAILY_BREAKDOWN_LIMIT,
+        ).returning(AIUsageDaily.breakdowns)
+        reserved = db.execute(stmt).scalar_one_or_none()
+        db.commit()
+    if reserved is None:
+        raise HTTPException(status_code=403, detail="FREE_LIMIT_REACHED")
+    return day
+
+
+def release_free_breakdown(user_id: int | None, day: dt.date | None) -> None:
+    """Gemini が結果を返せずフォールバックになった分を返す。"""
+    if user_id is None or day is None:
+        return
+    with SessionLocal() as db:
+        db.execute(
+            update(AIUsageDaily)
+            .where(AIUsageDaily.user_id == user_id, AIUsageDaily.day == day, AIUsageDaily.breakdowns > 0)
+            .values(breakdowns=AIUsageDaily.breakdowns - 1)
+        )
+        db.commit()
+
+
+class UsageRecorder:
+    """
+    Gemini 呼び出しの記録をメモリに溜め、一定間隔でまとめて書き込む（呼び出しの経路に DB 書き込みを挟まない）。
+    イベントは一括 INSERT、日次集計は (user_id, day) ごとに1回の upsert にまとめる。
+    """
+
+    def __init__(self, flush_interval: float, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: list[dict] = []
+        self._task: asyncio.Task | None = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flush_failures = 0
+
+    def record_call(self, kind: str, model: str, ok: bool, latency: float, usage: dict | None = None) -> None:
+        usage = usage or {}
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.pop(0)
+            self.dropped += 1
+        self._buffer.append(
+            {
+                "user_id": _caller.get()[0],
+                "day": dt.date.today(),
+                "kind": kind,
+                "model": model,
+                "ok": ok,
+                "prompt_tokens": int(usage.get("promptTokenCount") or 0),
+                "output_tokens": int(usage.get("candidatesTokenCount") or 0),
+                "latency_ms": int(latency * 1000),
+                "created_at": dt.datetime.utcnow(),
+            }
+        )
+        self.recorded += 1
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            await run_in_threadpool(_write_usage, rows)
+        except Exception as e:
+            self.flush_failures += 1
+            logger.exception("AI usage flush failed (%d rows dropped): %s", len(rows), e)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flush_failures": self.flush_failures,
+        }
+
+
+def _write_usage(rows: list[dict]) -> None:
+    totals: dict[tuple[int, dt.date], dict[str, int]] = defaultdict(
+        lambda: {"calls": 0, "failed_calls": 0, "prompt_tokens": 0, "output_tokens": 0, "latency_ms_total": 0}
+    )
+    for row in rows:
+        if row["user_id"] is None:
+            continue
+        total = totals[(row["user_id"], row["day"])]
+        total["calls"] += 1
+        total["failed_calls"] += 0 if row["ok"] else 1
+        total["prompt_tokens"] += row["prompt_tokens"]
+        total["output_tokens"] += row["output_tokens"]
+        total["latency_ms_total"] += row["latency_ms"]
+
+    with SessionLocal() as db:
+        db.execute(insert(AIUsageEvent), rows)
+        dialect_insert = _dialect_insert(db)
+        for (user_id, day), total in totals.items():
+            stmt = dialect_insert(AIUsageDaily).values(user_id=user_id, day=day, breakdowns=0, **total)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[AIUsageDaily.user_id, AIUsageDaily.day],
+                    set_={name: getattr(AIUsageDaily, name) + value for name, value in total.items()},
+                )
+            )
+        db.commit()
+
+
+usage_recorder = UsageRecorder(
+    flush_interval=settings.AI_USAGE_FLUSH_INTERVAL_SECONDS,
+    max_buffer=settings.AI_USAGE_MAX_BUFFER,
+)
@@ -0,0 +1,147 @@
+import datetime as dt
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.models.task import TaskType
+from app.schemas.task import BreakdownResponse, BreakdownTask
+
+
+def _normalize_text(value: str | None) -> str:
+    if not value:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+
+def breakdown_cache_key(
+    goal_title: str,
+    current_situation: str | None,
+    deadline: dt.date | None,
+    scope: tuple[int, int, int, int],
+    today: dt.date | None = None,
+) -> str:
+    """
+    入力と (months, weeks_per_month, days_per_week, yearly_milestones) からキーを作る。
+    目標名は年次マイルストーンや補完した月次タスクにそのまま入るので正規化せず、現状の説明だけ正規化する。
+    """
+    today = today or dt.date.today()
+    # 期限は絶対日付ではなく「今日から何日後か」で持つ（プロンプト上の意味が同じなら同じキー）
+    deadline_offset = (deadline - today).days if deadline else None
+    raw = json.dumps(
+        [goal_title, _normalize_text(current_situation), deadline_offset, list(scope)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _shift_month(month: int | None, shift: int) -> int | None:
+    if month is None:
+        return None
+    return ((month - 1 + shift) % 12) + 1
+
+
+def rebase_breakdown(response: BreakdownResponse, anchor: dt.date, today: dt.date) -> BreakdownResponse:
+    """
+    anchor 日に生成した分解結果を today 基準に付け替える。
+    build_breakdown は月・週・日をすべて「今日からの相対位置」で決めているので、その差分だけずらせばよい。
+    """
+    if anchor == today:
+        return response.model_copy(deep=True)
+    day_shift = (today - anchor).days
+    month_shift = (today.year - anchor.year) * 12 + (today.month - anchor.month)
+    week_shift = today.isocalendar().week - anchor.isocalendar().week
+
+    def rebase(item: BreakdownTask) -> BreakdownTask:
+        if item.type == TaskType.daily and item.date is not None:
+            day_date = item.date + dt.timedelta(days=day_shift)
+            return item.model_copy(
+                update={"date": day_date, "month": day_date.month, "week_number": day_date.isocalendar().week}
+            )
+        updates: dict = {"month": _shift_month(item.month, month_shift)}
+        if item.week_number is not None:
+            updates["week_number"] = item.week_number + week_shift
+        return item.model_copy(update=updates)
+
+    return BreakdownResponse(
+        source=response.source,
+        monthly=[rebase(item) for item in response.monthly],
+        weekly=[rebase(item) for item in response.weekly],
+        daily=[rebase(item) for item in response.daily],
+    )
+
+
+@dataclass
+class _Entry:
+    anchor: dt.date
+    response: BreakdownResponse
+    stored_at: float
+
+
+class BreakdownCache:
+    """LRU + TTL の分解結果キャッシュ。日付は生成日 (anchor) からの相対として扱う。"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, today: dt.date | None = None) -> BreakdownResponse | None:
+        today = today or dt.date.today()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return rebase_breakdown(entry.response, entry.anchor, today)
+
+    def put(self, key: str, response: BreakdownResponse, today: dt.date | None = None) -> None:
+        if self.max_entries <= 0:
+            return
+        entry = _Entry(anchor=today or dt.date.today(), response=response.model_copy(deep=True), stored_at=time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+breakdown_cache = BreakdownCache(
+    max_entries=settings.BREAKDOWN_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.BREAKDOWN_CACHE_TTL_SECONDS,
+)
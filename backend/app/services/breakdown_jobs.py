@@ -0,0 +1,269 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+import uuid
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.breakdown_job import BreakdownJob
+from app.models.goal import Goal
+from app.models.user import User
+from app.schemas.breakdown_job import BreakdownJobRead, BreakdownJobSubmitted
+from app.schemas.task import BreakdownResponse
+from app.services.breakdown_stream import stream_breakdown
+from app.services.ai_usage import check_free_limit, usage_scope
+from app.services.task_service import persist_breakdown
+
+logger = logging.getLogger(__name__)
+
+
+def create_breakdown_job(db: Session, goal: Goal, user_id: int, params: dict) -> BreakdownJob:
+    """ジョブを DB に登録する。実行はワーカーが拾うので、プロセスが落ちても再起動後に再開される。"""
+    job = BreakdownJob(
+        id=str(uuid.uuid4()),
+        goal_id=goal.id,
+        user_id=user_id,
+        status="queued",
+        params=params,
+        partial={"monthly": [], "weekly": [], "daily": []},
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def to_job_read(job: BreakdownJob) -> BreakdownJobRead:
+    read = BreakdownJobRead.model_validate(job)
+    if job.started_at:
+        read.queue_wait_ms = int((job.started_at - job.created_at).total_seconds() * 1000)
+        end = job.finished_at or dt.datetime.utcnow()
+        read.run_ms = int((end - job.started_at).total_seconds() * 1000)
+    return read
+
+
+def _claim_job(job_id: str) -> tuple[BreakdownJob, Goal] | None:
+    """queued（または心拍が途絶えた running）のジョブだけを原子的に running にする。"""
+    now = dt.datetime.utcnow()
+    stale_before = now - dt.timedelta(seconds=settings.BREAKDOWN_JOB_STALE_SECONDS)
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(BreakdownJob)
+            .where(
+                BreakdownJob.id == job_id,
+                BreakdownJob.attempts < settings.BREAKDOWN_JOB_MAX_ATTEMPTS,
+                or_(
+                    BreakdownJob.status == "queued",
+                    and_(BreakdownJob.status == "running", BreakdownJob.heartbeat_at < stale_before),
+                ),
+            )
+            .values(status="running", started_at=now, heartbeat_at=now, attempts=BreakdownJob.attempts + 1)
+        )
+        db.commit()
+        if claimed.rowcount == 0:
+            return None
+        job = db.get(BreakdownJob, job_id)
+        goal = db.get(Goal, job.goal_id) if job else None
+        if job is None or goal is None:
+            return None
+        return job, goal
+
+
+def _owned(job_id: str, attempt: int):
+    # 心拍が途絶えて別のワーカーに取り直されたら attempts が進むので、古い実行の書き込みは当たらない
+    return and_(BreakdownJob.id == job_id, BreakdownJob.status == "running", BreakdownJob.attempts == attempt)
+
+
+def _save_progress(job_id: str, attempt: int, partial: dict) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(BreakdownJob)
+            .where(_owned(job_id, attempt))
+            .values(partial=partial, heartbeat_at=dt.datetime.utcnow())
+        )
+        db.commit()
+
+
+def _finish_job(
+    job_id: str,
+    attempt: int,
+    status: str,
+    partial: dict,
+    result: dict | None = None,
+    error: str | None = None,
+    persist: tuple[Goal, BreakdownResponse, bool] | None = None,
+) -> bool:
+    """
+    状態の更新とタスクの保存を1トランザクションで行う。
+    このワーカーがもうジョブを持っていなければ何も書かずに False を返す（再実行でタスクが二重にならない）。
+    """
+    now = dt.datetime.utcnow()
+    with SessionLocal() as db:
+        # 先に行を更新してロックを取り、同時に取り直そうとするワーカーを commit まで待たせる
+        finished = db.execute(
+            update(BreakdownJob)
+            .where(_owned(job_id, attempt))
+            .values(status=status, partial=partial, result=result, error=error, finished_at=now, heartbeat_at=now)
+        ).rowcount
+        if finished == 0:
+            db.rollback()
+            logger.warning("Breakdown job %s (attempt %s) was taken over; discarding its result", job_id, attempt)
+            return False
+        if persist is not None:
+            goal, breakdown, replace_existing = persist
+            persist_breakdown(db, goal, breakdown, replace_existing=replace_existing, commit=False)
+        db.commit()
+        return True
+
+
+def _recoverable_job_ids() -> list[str]:
+    """再起動や他プロセスの停止で取り残されたジョブを探す。試行回数を使い切ったものは失敗にする。"""
+    now = dt.datetime.utcnow()
+    stale_before = now - dt.timedelta(seconds=settings.BREAKDOWN_JOB_STALE_SECONDS)
+    stale = and_(BreakdownJob.status == "running", BreakdownJob.heartbeat_at < stale_before)
+    with SessionLocal() as db:
+        db.execute(
+            update(BreakdownJob)
+            .where(stale, BreakdownJob.attempts >= settings.BREAKDOWN_JOB_MAX_ATTEMPTS)
+            .values(status="failed", error="Job was interrupted too many times", finished_at=now)
+        )
+        db.commit()
+        return list(
+            db.scalars(
+                select(BreakdownJob.id)
+                .where(or_(BreakdownJob.status == "queued", stale))
+                .order_by(BreakdownJob.created_at)
+                .limit(settings.BREAKDOWN_JOB_MAX_QUEUED)
+            )
+        )
+
+
+async def run_breakdown_job(job_id: str) -> None:
+    claimed = await run_in_threadpool(_claim_job, job_id)
+    if claimed is None:
+        return
+    job, goal = claimed
+    params = job.params
+    attempt = job.attempts
+    partial: dict = {"monthly": [], "weekly": [], "daily": []}
+    breakdown: BreakdownResponse | None = None
+    last_flush = time.monotonic()
+    try:
+        with usage_scope(job.user_id, params.get("premium", False)):
+            async for event in stream_breakdown(
+                goal,
+                params["months"],
+                params["weeks_per_month"],
+                params["days_per_week"],
+                yearly_milestones=params.get("yearly_milestones", 0),
+                current_situation=params.get("current_situation"),
+            ):
+                kind = event["event"]
+                if kind in partial:
+                    partial[kind].append(jsonable_encoder(event["task"]))
+                elif kind == "replace":
+                    partial[event["tier"]] = jsonable_encoder(event["tasks"])
+                elif kind == "daily_detail" and event["index"] < len(partial["daily"]):
+                    partial["daily"][event["index"]]["note"] = event["note"]
+                elif kind == "error":
+                    raise RuntimeError(event["detail"])
+                elif kind == "done":
+                    breakdown = event["breakdown"]
+                if time.monotonic() - last_flush >= settings.BREAKDOWN_JOB_PROGRESS_INTERVAL_SECONDS:
+                    await run_in_threadpool(_save_progress, job_id, attempt, partial)
+                    last_flush = time.monotonic()
+
+        if breakdown is None:
+            raise RuntimeError("Breakdown stream ended without a result")
+        persist = (goal, breakdown, params.get("replace_existing", True)) if params.get("persist", True) else None
+        await run_in_threadpool(
+            _finish_job, job_id, attempt, "succeeded", partial, jsonable_encoder(breakdown), None, persist
+        )
+    except Exception as e:
+        logger.exception("Breakdown job %s failed: %s", job_id, e)
+        await run_in_threadpool(_finish_job, job_id, attempt, "failed", partial, None, str(e)[:500])
+
+
+class BreakdownJobRunner:
+    """固定数のワーカーでジョブを処理する。キューは DB が正で、メモリ上のキューは各プロセスの作業待ち行列。"""
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: asyncio.Queue[str] | None = None
+        self._pending: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recovery_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._pending.clear()
+
+    def ensure_capacity(self) -> None:
+        if len(self._pending) >= self.max_queued:
+            raise HTTPException(status_code=503, detail="Too many breakdown jobs in progress")
+
+    def enqueue(self, job_id: str) -> None:
+        if self._queue is None or job_id in self._pending:
+            return
+        self._pending.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": len(self._pending),
+            "max_queued": self.max_queued,
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await run_breakdown_job(job_id)
+            except Exception as e:
+                logger.exception("Breakdown worker error on %s: %s", job_id, e)
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _recovery_loop(self) -> None:
+        while True:
+            try:
+                for job_id in await run_in_threadpool(_recoverable_job_ids):
+                    self.enqueue(job_id)
+            except Exception as e:
+                logger.exception("Breakdown job recovery failed: %s", e)
+            await asyncio.sleep(settings.BREAKDOWN_JOB_RECOVERY_INTERVAL_SECONDS)
+
+
+breakdown_job_runner = BreakdownJobRunner(
+    workers=settings.BREAKDOWN_JOB_WORKERS,
+    max_queued=settings.BREAKDOWN_JOB_MAX_QUEUED,
+)
+
+
+async def submit_breakdown_job(db: Session, goal: Goal, current_user: User, params: dict) -> BreakdownJobSubmitted:
+    breakdown_job_runner.ensure_capacity()
+    await run_in_threadpool(check_free_limit, db, current_user)
+    # ワーカーでの受付優先度に使う
+    params = {**params, "premium": bool(current_user.is_premium)}
+    job = await run_in_threadpool(create_breakdown_job, db, goal, current_user.id, params)
+    breakdown_job_runner.enqueue(job.id)
+    return BreakdownJobSubmitted(job_id=job.id, status=job.status, status_url=f"/breakdown-jobs/{job.id}")
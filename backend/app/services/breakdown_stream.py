@@ -0,0 +1,240 @@
+import asyncio
+import datetime as dt
+import json
+import logging
+from collections.abc import AsyncIterator
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.goal import Goal
+from app.schemas.task import BreakdownResponse
+from app.services.ai_usage import current_caller, release_free_breakdown, reserve_free_breakdown
+from app.services.breakdown_cache import breakdown_cache, breakdown_cache_key
+from app.services.gemini_client import build_json_payload, gemini_deadline, stream_content
+from app.services.task_service import (
+    _fallback_breakdown,
+    _fallback_daily_details,
+    _request_gemini_daily_details,
+    _strip_period_prefix,
+    assemble_breakdown,
+    breakdown_prompt,
+    daily_item,
+    monthly_item,
+    normalize_tier_titles,
+    weekly_item,
+    yearly_milestone_items,
+)
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("monthly", "weekly", "daily")
+
+
+class TierStreamParser:
+    """
+    {"monthly":[...],"weekly":[...],"daily":[...]} 形式の JSON をテキスト断片から逐次読み取る。
+    トップレベル配列の文字列要素が閉じた時点で (tier, title) を、配列が閉じた時点で (tier, None) を返す。
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buf: list[str] = []
+        self._last_key: str | None = None
+        self._array_key: str | None = None
+
+    def feed(self, text: str) -> list[tuple[str, str | None]]:
+        events: list[tuple[str, str | None]] = []
+        for ch in text:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buf.append(ch)
+                elif ch == "\\":
+                    self._escape = True
+                    self._buf.append(ch)
+                elif ch == '"':
+                    self._in_string = False
+                    value = json.loads('"' + "".join(self._buf) + '"')
+                    if self._depth == 1:
+                        self._last_key = value
+                    elif self._depth == 2 and self._array_key is not None:
+                        events.append((self._array_key, value))
+                else:
+                    self._buf.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._buf = []
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and ch == "[":
+                    self._array_key = self._last_key
+            elif ch in "}]":
+                if self._depth == 2 and self._array_key is not None:
+                    events.append((self._array_key, None))
+                    self._array_key = None
+                self._depth = max(0, self._depth - 1)
+            elif ch == "," and self._depth == 1:
+                self._last_key = None
+        return events
+
+
+def _replay(breakdown: BreakdownResponse) -> list[dict]:
+    events: list[dict] = []
+    for tier in TIERS:
+        for idx, item in enumerate(getattr(breakdown, tier)):
+            events.append({"event": tier, "index": idx, "task": item})
+    events.append({"event": "done", "breakdown": breakdown})
+    return events
+
+
+def _placement(item) -> tuple:
+    # 日次の note は daily_detail で後から届くので比べない
+    return item.type, item.title, item.month, item.week_number, item.date
+
+
+async def stream_breakdown(
+    goal: Goal,
+    months: int,
+    weeks_per_month: int,
+    days_per_week: int,
+    yearly_milestones: int = 0,
+    current_situation: str | None = None,
+) -> AsyncIterator[dict]:
+    """
+    build_breakdown のストリーミング版。月次・週次・日次の各項目を確定した順にイベントとして返し、
+    最後に build_breakdown と同じ形の結果を "done" イベントで返す。無料枠チェックは呼び出し側で行う。
+    月次は先頭の補完（normalize_tier_titles）で位置が変わるので、配列が閉じてから補完後の並びで返す。
+    途中で失敗して補完された段は、"done" の前に {"event": "replace", "tier", "tasks"} で差し替える。
+    """
+    today = dt.date.today()
+    if not settings.GEMINI_API_KEY:
+        for event in _replay(_fallback_breakdown(goal, months, weeks_per_month, days_per_week)):
+            yield event
+        return
+
+    cache_key = breakdown_cache_key(
+        goal.title,
+        current_situation,
+        goal.deadline,
+        (months, weeks_per_month, days_per_week, yearly_milestones),
+        today=today,
+    )
+    cached = breakdown_cache.get(cache_key, today=today)
+    if cached is not None:
+        for event in _replay(cached):
+            yield event
+        return
+
+    # 無料枠は Gemini を呼ぶ分だけ確保する（呼び出し元は usage_scope で渡される）
+    user_id, premium = current_caller()
+    try:
+        reserved_day = await run_in_threadpool(reserve_free_breakdown, user_id, premium)
+    except HTTPException as e:
+        yield {"event": "error", "detail": e.detail}
+        return
+
+    # ストリーム受信と詳細TODO生成で1つの持ち時間を共有する
+    with gemini_deadline():
+        milestones = yearly_milestone_items(goal, months, yearly_milestones)
+        emitted: dict[str, list] = {tier: [] for tier in TIERS}
+        for idx, item in enumerate(milestones):
+            emitted["monthly"].append(item)
+            yield {"event": "monthly", "index": idx, "task": item}
+
+        limits = {"monthly": months, "weekly": weeks_per_month, "daily": days_per_week}
+        titles: dict[str, list[str]] = {tier: [] for tier in TIERS}
+        details_task: asyncio.Task | None = None
+        details_titles: list[str] = []
+        stream_ok = True
+
+        try:
+            prompt = breakdown_prompt(
+                goal.title, months, weeks_per_month, days_per_week, goal.deadline, current_situation
+            )
+            parser = TierStreamParser()
+            try:
+                async for chunk in stream_content(build_json_payload(prompt), kind="breakdown_stream"):
+                    for tier, raw_title in parser.feed(chunk):
+                        if tier not in titles:
+                            continue
+                        if raw_title is None:
+                            if tier == "monthly" and len(emitted["monthly"]) == len(milestones):
+                                monthly_titles = normalize_tier_titles(
+                                    goal, {"monthly": titles["monthly"]}, months, weeks_per_month, days_per_week
+                                )[0]
+                                for idx, title in enumerate(monthly_titles):
+                                    item = monthly_item(idx, title, today)
+                                    emitted["monthly"].append(item)
+                                    yield {"event": "monthly", "index": len(milestones) + idx, "task": item}
+                                continue
+                            # 日次タイトルが揃った時点で詳細TODOの生成を並行して始める
+                            if tier == "daily" and details_task is None and titles["daily"]:
+                                details_titles = list(titles["daily"])
+                                details_task = asyncio.create_task(_request_gemini_daily_details(details_titles))
+                            continue
+                        title = raw_title.strip() if tier == "daily" else _strip_period_prefix(raw_title)
+                        if not title or len(titles[tier]) >= limits[tier]:
+                            continue
+                        idx = len(titles[tier])
+                        titles[tier].append(title)
+                        if tier == "weekly":
+                            item = weekly_item(idx, title, today)
+                        elif tier == "daily":
+                            item = daily_item(idx, title, today)
+                        else:
+                            continue
+                        emitted[tier].append(item)
+                        yield {"event": tier, "index": idx, "task": item}
+            except Exception as e:
+                logger.exception("Gemini breakdown stream failed: %s", e)
+                stream_ok = False
+                if not any(titles.values()):
+                    if details_task is not None:
+                        details_task.cancel()
+                    await run_in_threadpool(release_free_breakdown, user_id, reserved_day)
+                    # 送信済みの年次マイルストーンはフォールバックに含まれないので、月次を空にしてから送り直す
+                    if emitted["monthly"]:
+                        yield {"event": "replace", "tier": "monthly", "tasks": []}
+                    for event in _replay(_fallback_breakdown(goal, months, weeks_per_month, days_per_week)):
+                        yield event
+                    return
+
+            monthly_titles, weekly_titles, daily_titles = normalize_tier_titles(
+                goal, titles, months, weeks_per_month, days_per_week
+            )
+            if details_task is not None and details_titles != daily_titles:
+                details_task.cancel()
+                details_task = None
+            if details_task is None:
+                details_task = asyncio.create_task(_request_gemini_daily_details(daily_titles))
+
+            details_ok = False
+            try:
+                daily_details = await details_task
+                details_ok = True
+            except Exception as e:
+                logger.exception("Gemini daily details failed: %s", e)
+                daily_details = [_fallback_daily_details(title) for title in daily_titles]
+
+            result = assemble_breakdown(
+                goal, months, yearly_milestones, monthly_titles, weekly_titles, daily_titles, daily_details, today
+            )
+            for tier in TIERS:
+                final = getattr(result, tier)
+                if [_placement(item) for item in emitted[tier]] != [_placement(item) for item in final]:
+                    yield {"event": "replace", "tier": tier, "tasks": final}
+            for idx, item in enumerate(result.daily):
+                yield {"event": "daily_detail", "index": idx, "note": item.note}
+            if stream_ok and details_ok:
+                breakdown_cache.put(cache_key, result, today=today)
+            yield {"event": "done", "breakdown": result}
+        finally:
+            # クライアントの切断（GeneratorExit）でも詳細TODOの呼び出しを止め、受付枠を返す
+            if details_task is not None and not details_task.done():
+                details_task.cancel()
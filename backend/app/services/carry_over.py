@@ -0,0 +1,186 @@
+"""
+未完了の日次タスクの持ち越し。日付が変わったタイミングでまとめて実行する。
+
+    python -m app.services.carry_over                 # 今日（CARRY_OVER_TIMEZONE）を基準に全ユーザー分
+    python -m app.services.carry_over --date 2026-01-01 --user-id 3
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import logging
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, delete, exists, false, text, update
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql.elements import ColumnElement
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.task import Task, TaskType
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock のキー（"STRC"）。ワーカーごとのスケジューラーが同時に走っても1つだけが実行する
+CARRY_OVER_LOCK_KEY = 0x53545243
+
+
+def local_today() -> dt.date:
+    return dt.datetime.now(ZoneInfo(settings.CARRY_OVER_TIMEZONE)).date()
+
+
+def _overdue(task, target_date: dt.date, user_id: int | None) -> ColumnElement[bool]:
+    conditions = [
+        task.type == TaskType.daily,
+        # IS false ではなく = false にする（部分インデックス ix_tasks_open_daily_user_date の述語と同じ形）
+        task.is_done == false(),
+        task.date.is_not(None),
+        task.date < target_date,
+    ]
+    if user_id is not None:
+        conditions.append(task.user_id == user_id)
+    return and_(*conditions)
+
+
+def _same_task(a, b) -> ColumnElement[bool]:
+    # goal_id / tags / note は NULL 同士も同じとみなす
+    return and_(
+        a.user_id == b.user_id,
+        a.goal_id.is_not_distinct_from(b.goal_id),
+        a.title == b.title,
+        a.tags.is_not_distinct_from(b.tags),
+        a.note.is_not_distinct_from(b.note),
+    )
+
+
+def _try_lock(db: Session) -> bool:
+    # トランザクション終了（commit / rollback）で自動的に外れる。SQLite は書き込みがファイル単位で直列化される
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": CARRY_OVER_LOCK_KEY}))
+
+
+def carry_over_overdue(db: Session, target_date: dt.date, user_id: int | None = None) -> dict[str, int] | None:
+    """
+    target_date より前の未完了の日次タスクを target_date に移す。タスク数によらず4文で終わる。
+    1. target_date に同じ内容のタスクがあれば、そちらを持ち越し扱い・未完了にする
+    2. 1 で統合された元タスクを削除する
+    3. 期限切れタスク同士の重複は id の小さい1件だけ残す
+    4. 残りの日付を target_date に移す
+    ほかのプロセスが実行中なら何もせず None を返す。
+    """
+    if not _try_lock(db):
+        db.rollback()
+        return None
+    src = aliased(Task)
+    dst = aliased(Task)
+    now = dt.datetime.utcnow()
+
+    on_target = and_(dst.type == TaskType.daily, dst.date == target_date)
+    merged = db.execute(
+        update(Task)
+        .where(
+            Task.type == TaskType.daily,
+            Task.date == target_date,
+            exists().where(_overdue(src, target_date, user_id), _same_task(src, Task)),
+        )
+        .values(carried_over=True, is_done=False, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    merged_sources = db.execute(
+        delete(Task)
+        .where(_overdue(Task, target_date, user_id), exists().where(on_target, _same_task(dst, Task)))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    deduped = db.execute(
+        delete(Task)
+        .where(
+            _overdue(Task, target_date, user_id),
+            exists().where(_overdue(src, target_date, user_id), _same_task(src, Task), src.id < Task.id),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    moved = db.execute(
+        update(Task)
+        .where(_overdue(Task, target_date, user_id))
+        .values(date=target_date, carried_over=True, updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return {"merged": merged, "merged_sources": merged_sources, "deduped": deduped, "moved": moved}
+
+
+def run_carry_over(target_date: dt.date | None = None, user_id: int | None = None) -> dict[str, int] | None:
+    target_date = target_date or local_today()
+    with SessionLocal() as db:
+        result = carry_over_overdue(db, target_date, user_id)
+    if result is None:
+        logger.info("Carry-over to %s skipped: another process is running it", target_date)
+    else:
+        logger.info("Carry-over to %s: %s", target_date, result)
+    return result
+
+
+class CarryOverScheduler:
+    """起動時に1回（取りこぼしの回収）、以降は CARRY_OVER_TIMEZONE の日付が変わるたびに実行する。"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.last_run_date: dt.date | None = None
+        self.last_result: dict[str, int] | None = None
+        self.skipped = 0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            today = local_today()
+            if self.last_run_date != today:
+                try:
+                    result = await run_in_threadpool(run_carry_over, today)
+                    if result is None:
+                        # ほかのワーカーが実行中。終わった後にもう一度流す（対象が残っていなければ何もしない）
+                        self.skipped += 1
+                        await asyncio.sleep(60.0)
+                        continue
+                    self.last_result = result
+                    self.last_run_date = today
+                except Exception as e:
+                    logger.exception("Carry-over failed: %s", e)
+            tz = ZoneInfo(settings.CARRY_OVER_TIMEZONE)
+            now = dt.datetime.now(tz)
+            next_midnight = dt.datetime.combine(now.date() + dt.timedelta(days=1), dt.time(), tzinfo=tz)
+            await asyncio.sleep(max(60.0, (next_midnight - now).total_seconds() + settings.CARRY_OVER_DELAY_SECONDS))
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "last_run_date": self.last_run_date.isoformat() if self.last_run_date else None,
+            "last_result": self.last_result,
+            "skipped": self.skipped,
+        }
+
+
+carry_over_scheduler = CarryOverScheduler()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Carry unfinished daily tasks over to a date")
+    parser.add_argument("--date", type=dt.date.fromisoformat, default=None)
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(run_carry_over(args.date, args.user_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    直近 window_seconds の呼び出し結果からエラー率・遅延率を見て回路を開閉する。
+    open の間は呼び出しを即座に拒否し、open_seconds 経過後は half_open として
+    half_open_trials 件だけ試行を通す。試行がすべて成功すれば closed、1件でも失敗すれば再び open。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate_threshold: float,
+        slow_call_seconds: float,
+        slow_rate_threshold: float,
+        open_seconds: float,
+        half_open_trials: int,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_trials = half_open_trials
+
+        self.state = CLOSED
+        self._calls: deque[tuple[float, bool, float]] = deque()
+        self._opened_at = 0.0
+        self._trials_in_flight = 0
+        self._trial_successes = 0
+        self.rejected = 0
+        self.transitions: dict[str, int] = {}
+        self.last_transition_at: float | None = None
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        logger.warning("Circuit %s: %s", self.name, key)
+        self.state = state
+        self.last_transition_at = time.time()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self._trials_in_flight = 0
+            self._trial_successes = 0
+        if state == CLOSED:
+            self._calls.clear()
+
+    def _prune(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _rates(self) -> tuple[int, float, float]:
+        total = len(self._calls)
+        if total == 0:
+            return 0, 0.0, 0.0
+        failures = sum(1 for _, ok, _ in self._calls if not ok)
+        slow = sum(1 for _, _, latency in self._calls if latency >= self.slow_call_seconds)
+        return total, failures / total, slow / total
+
+    def before_call(self) -> bool:
+        """呼び出し可否を判定する。拒否時は CircuitOpenError。half_open の試行なら True を返す。"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit {self.name} is open")
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trials_in_flight >= self.half_open_trials:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit {self.name} is half-open and trials are in flight")
+            self._trials_in_flight += 1
+            return True
+        return False
+
+    def record(self, ok: bool, latency: float, trial: bool) -> None:
+        now = time.monotonic()
+        if trial:
+            if self.state != HALF_OPEN:
+                return
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+            if not ok or latency >= self.slow_call_seconds:
+                self._transition(OPEN)
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_trials:
+                self._transition(CLOSED)
+            return
+
+        self._calls.append((now, ok, latency))
+        self._prune(now)
+        if self.state != CLOSED:
+            return
+        total, failure_rate, slow_rate = self._rates()
+        if total >= self.min_calls and (
+            failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_rate_threshold
+        ):
+            self._transition(OPEN)
+
+    def release(self, trial: bool) -> None:
+        """結果を判定できないまま終わった呼び出し（キャンセル等）の試行枠を返す。"""
+        if trial and self.state == HALF_OPEN:
+            self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    @contextmanager
+    def guard(self):
+        trial = self.before_call()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(False, time.monotonic() - started, trial)
+            raise
+        except BaseException:
+            self.release(trial)
+            raise
+        self.record(True, time.monotonic() - started, trial)
+
+    def snapshot(self) -> dict:
+        self._prune(time.monotonic())
+        total, failure_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "failure_rate": failure_rate,
+            "slow_rate": slow_rate,
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+            "last_transition_at": self.last_transition_at,
+        }
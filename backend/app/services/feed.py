@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.utils.pagination import SortKey
+from app.models.friendship import Friendship
+from app.models.post import Post
+from app.schemas.post import PostRead
+
+POST_LIST_ORDER = [SortKey(Post.created_at, descending=True), SortKey(Post.id, descending=True)]
+
+
+async def friend_ids(db: AsyncSession, user_id: int) -> list[int]:
+    return list(await db.scalars(select(Friendship.friend_id).where(Friendship.user_id == user_id)))
+
+
+def to_post_read(post: Post, viewer_id: int | None) -> PostRead:
+    """post.user と post.likes は selectinload 済みであること。"""
+    pr = PostRead.model_validate(post)
+    pr.user_name = post.user.name if post.user else None
+    pr.user_avatar_url = post.user.avatar_url if post.user else None
+    pr.likes_count = len(post.likes)
+    pr.is_liked_by_you = any(like.user_id == viewer_id for like in post.likes) if viewer_id else False
+    return pr
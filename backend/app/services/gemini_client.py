@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.services.ai_scheduler import FREE, PREMIUM, ai_scheduler
+from app.services.ai_usage import current_caller, usage_recorder
+from app.services.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+BASE_VERSIONS = ["v1beta", "v1"]
+FALLBACK_MODELS = [
+    "gemini-2.5-flash",
+    "gemini-2.0-flash",
+    "gemini-1.5-flash-latest",
+    "gemini-1.5-flash",
+]
+
+_client: httpx.AsyncClient | None = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.GEMINI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GEMINI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.GEMINI_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    return httpx.AsyncClient(
+        http2=settings.GEMINI_HTTP2,
+        limits=limits,
+        timeout=httpx.Timeout(settings.GEMINI_TIMEOUT_SECONDS, connect=10.0),
+    )
+
+
+async def start_gemini_client() -> None:
+    """アプリ起動時に共有クライアントを作成する（接続はプールで使い回す）。"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+
+
+async def close_gemini_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_gemini_client() -> httpx.AsyncClient:
+    # スクリプト等で startup フックを通らない場合も遅延生成して使えるようにする
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def model_candidates() -> list[str]:
+    return list(dict.fromkeys([settings.GEMINI_MODEL, *FALLBACK_MODELS]))
+
+
+@dataclass(frozen=True)
+class GeminiEndpoint:
+    version: str
+    model: str
+
+
+class EndpointResolver:
+    """
+    動作する (version, model) の組をプロセス内で記憶する。
+    TTL 内は記憶した組だけを使い、404/5xx を受けたときか TTL 切れのときだけ候補を先頭から探し直す。
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._resolved: GeminiEndpoint | None = None
+        self._resolved_at = 0.0
+        self.probe_count = 0
+
+    def current(self) -> GeminiEndpoint | None:
+        if self._resolved is None:
+            return None
+        if time.monotonic() - self._resolved_at > self.ttl_seconds:
+            return None
+        return self._resolved
+
+    def candidates(self) -> list[GeminiEndpoint]:
+        all_endpoints = [GeminiEndpoint(version, model) for version in BASE_VERSIONS for model in model_candidates()]
+        resolved = self.current()
+        if resolved is None:
+            return all_endpoints
+        return [resolved] + [ep for ep in all_endpoints if ep != resolved]
+
+    def remember(self, endpoint: GeminiEndpoint) -> None:
+        if endpoint != self._resolved:
+            logger.info("Gemini endpoint resolved: %s/%s", endpoint.version, endpoint.model)
+        self._resolved = endpoint
+        self._resolved_at = time.monotonic()
+
+    def invalidate(self, endpoint: GeminiEndpoint) -> None:
+        if endpoint == self._resolved:
+            logger.warning("Gemini endpoint %s/%s invalidated", endpoint.version, endpoint.model)
+            self._resolved = None
+
+    def snapshot(self) -> dict:
+        resolved = self.current()
+        expires_in = None
+        if resolved is not None:
+            expires_in = max(0.0, self.ttl_seconds - (time.monotonic() - self._resolved_at))
+        return {
+            "resolved": (
+                {"version": resolved.version, "model": resolved.model, "url": endpoint_url(resolved.version, resolved.model, key=False)}
+                if resolved
+                else None
+            ),
+            "expires_in_seconds": expires_in,
+            "ttl_seconds": self.ttl_seconds,
+            "probe_count": self.probe_count,
+            "candidates": [f"{ep.version}/{ep.model}" for ep in self.candidates()],
+        }
+
+
+endpoint_resolver = EndpointResolver(ttl_seconds=settings.GEMINI_ENDPOINT_TTL_SECONDS)
+
+# 分解・詳細TODO・修正提案のすべての呼び出しで共有する
+gemini_breaker = CircuitBreaker(
+    name="gemini",
+    window_seconds=settings.GEMINI_BREAKER_WINDOW_SECONDS,
+    min_calls=settings.GEMINI_BREAKER_MIN_CALLS,
+    failure_rate_threshold=settings.GEMINI_BREAKER_FAILURE_RATE,
+    slow_call_seconds=settings.GEMINI_BREAKER_SLOW_CALL_SECONDS,
+    slow_rate_threshold=settings.GEMINI_BREAKER_SLOW_RATE,
+    open_seconds=settings.GEMINI_BREAKER_OPEN_SECONDS,
+    half_open_trials=settings.GEMINI_BREAKER_HALF_OPEN_TRIALS,
+)
+
+
+def build_json_payload(prompt: str, temperature: float = 0.6) -> dict:
+    return {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": temperature,
+            "response_mime_type": "application/json",
+        },
+    }
+
+
+def endpoint_url(version: str, model: str, method: str = "generateContent", key: bool = True) -> str:
+    url = f"{settings.GEMINI_BASE_URL.rstrip('/')}/{version}/models/{model}:{method}"
+    return f"{url}?key={settings.GEMINI_API_KEY}" if key else url
+
+
+def extract_text(body: dict) -> str:
+    return (
+        body.get("candidates", [{}])[0]
+        .get("content", {})
+        .get("parts", [{}])[0]
+        .get("text", "{}")
+    )
+
+
+class GeminiDeadlineExceeded(TimeoutError):
+    pass
+
+
+class _EndpointNotFound(Exception):
+    pass
+
+
+_deadline: ContextVar[float | None] = ContextVar("gemini_deadline", default=None)
+
+gemini_stats = {
+    "hedged_requests": 0,
+    "hedge_wins": 0,
+    "deadline_exceeded": 0,
+}
+
+
+@contextmanager
+def gemini_deadline(seconds: float | None = None):
+    """
+    この中で行う Gemini 呼び出し全体の持ち時間を設定する。全試行がこの残り時間から消費する。
+    外側ですでに短い期限が設定されていればそちらを優先する。
+    """
+    seconds = settings.GEMINI_TOTAL_DEADLINE_SECONDS if seconds is None else seconds
+    candidate = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(candidate if current is None else min(current, candidate))
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # 非同期ジェネレータが別コンテキストで閉じられた場合は戻す必要がない
+            pass
+
+
+def remaining_budget() -> float | None:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _admission():
+    """呼び出し元のユーザー・プランで受付待ちに並ぶ。待てるのは AI_ADMISSION_TIMEOUT_SECONDS と残り持ち時間の短い方まで。"""
+    user_id, premium = current_caller()
+    timeout = settings.AI_ADMISSION_TIMEOUT_SECONDS
+    remaining = remaining_budget()
+    if remaining is not None:
+        timeout = min(timeout, remaining)
+    return ai_scheduler.admit(user_id, PREMIUM if premium else FREE, timeout)
+
+
+def _attempt_timeout() -> float:
+    remaining = remaining_budget()
+    if remaining is None:
+        return settings.GEMINI_TIMEOUT_SECONDS
+    if remaining <= 0:
+        gemini_stats["deadline_exceeded"] += 1
+        raise GeminiDeadlineExceeded("Gemini deadline budget exhausted")
+    return min(settings.GEMINI_TIMEOUT_SECONDS, remaining)
+
+
+async def _attempt(
+    endpoint: GeminiEndpoint, payload: dict, parse: Callable[[dict], T], remember: bool, kind: str
+) -> T:
+    timeout = _attempt_timeout()
+    if endpoint != endpoint_resolver.current():
+        endpoint_resolver.probe_count += 1
+    started = time.monotonic()
+    response = await get_gemini_client().post(
+        endpoint_url(endpoint.version, endpoint.model), json=payload, timeout=timeout
+    )
+    if response.status_code == 404 or response.status_code >= 500:
+        endpoint_resolver.invalidate(endpoint)
+    if response.status_code == 404:
+        raise _EndpointNotFound()
+    ok = False
+    usage: dict | None = None
+    try:
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usageMetadata")
+        value = parse(body)
+        ok = True
+    finally:
+        # 応答が返ったリクエストは成否にかかわらず記録する（404 はモデル探索なので除く）
+        usage_recorder.record_call(kind, endpoint.model, ok, time.monotonic() - started, usage)
+    if remember:
+        endpoint_resolver.remember(endpoint)
+    return value
+
+
+async def _attempt_chain(
+    endpoints: list[GeminiEndpoint], payload: dict, parse: Callable[[dict], T], kind: str, remember: bool = True
+) -> T:
+    """候補を順に試す。404 は読み飛ばし、HTTP エラー・タイムアウト・不正な JSON は次の候補で再試行する。"""
+    last_error: Exception | None = None
+    for endpoint in endpoints:
+        try:
+            return await _attempt(endpoint, payload, parse, remember, kind)
+        except _EndpointNotFound:
+            continue
+        except GeminiDeadlineExceeded:
+            raise
+        except Exception as e:
+            last_error = e
+            continue
+    if last_error:
+        raise last_error
+    raise ValueError("No available Gemini model/endpoint was found (404).")
+
+
+def _hedge_endpoint(endpoints: list[GeminiEndpoint]) -> GeminiEndpoint | None:
+    if not endpoints:
+        return None
+    primary = endpoints[0]
+    for endpoint in endpoints[1:]:
+        if endpoint.version == primary.version and endpoint.model != primary.model:
+            return endpoint
+    return None
+
+
+async def generate_json(payload: dict, parse: Callable[[dict], T], kind: str = "generate") -> T:
+    """
+    generateContent を呼び出し、parse が成功した最初の結果を返す。
+    主系の応答が GEMINI_HEDGE_DELAY_SECONDS を超えて返らない場合は別モデルにも投げ、先に妥当な応答を返した方を採用する。
+    回路が開いている間は CircuitOpenError を即座に送出する（呼び出し側のフォールバックに任せる）。
+    kind は利用記録の区分（breakdown / daily_details / revision など）。
+    受付待ちが期限内に終わらなければ AdmissionRejected を送出する（回路の失敗には数えない）。
+    """
+    async with _admission():
+        with gemini_breaker.guard():
+            return await _generate_json(payload, parse, kind)
+
+
+async def _generate_json(payload: dict, parse: Callable[[dict], T], kind: str) -> T:
+    # 呼び出し側が持ち時間を決めていなければ既定の持ち時間を使う
+    with gemini_deadline() if _deadline.get() is None else nullcontext():
+        endpoints = endpoint_resolver.candidates()
+        primary = asyncio.create_task(_attempt_chain(endpoints, payload, parse, kind))
+        hedge: asyncio.Task | None = None
+        try:
+            hedge_endpoint = _hedge_endpoint(endpoints)
+            delay = settings.GEMINI_HEDGE_DELAY_SECONDS
+            if hedge_endpoint is None or delay <= 0:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if primary in done:
+                return primary.result()
+
+            gemini_stats["hedged_requests"] += 1
+            hedge = asyncio.create_task(_attempt_chain([hedge_endpoint], payload, parse, kind, remember=False))
+            pending = {primary, hedge}
+            errors: dict[asyncio.Task, BaseException] = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            gemini_stats["hedge_wins"] += 1
+                        return task.result()
+                    errors[task] = task.exception()
+            raise errors.get(primary) or errors[hedge]
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+async def stream_content(payload: dict, kind: str = "stream") -> AsyncIterator[str]:
+    """
+    streamGenerateContent (SSE) を呼び出し、届いたテキスト断片を順に返す。
+    エンドポイントの選び方は generate_json と同じだが、受信開始後は他候補に切り替えない。
+    受信中も持ち時間を確認し、使い切ったら GeminiDeadlineExceeded を送出する。
+    """
+    async with _admission():
+        with gemini_breaker.guard():
+            async for chunk in _stream_content(payload, kind):
+                yield chunk
+
+
+async def _stream_content(payload: dict, kind: str) -> AsyncIterator[str]:
+    client = get_gemini_client()
+    last_error: Exception | None = None
+    for endpoint in endpoint_resolver.candidates():
+        timeout = _attempt_timeout()
+        if endpoint != endpoint_resolver.current():
+            endpoint_resolver.probe_count += 1
+        url = endpoint_url(endpoint.version, endpoint.model, "streamGenerateContent") + "&alt=sse"
+        started = time.monotonic()
+        async with client.stream("POST", url, json=payload, timeout=timeout) as response:
+            if response.status_code == 404 or response.status_code >= 500:
+                endpoint_resolver.invalidate(endpoint)
+            if response.status_code == 404:
+                continue
+            try:
+                response.raise_for_status()
+            except Exception as e:
+                usage_recorder.record_call(kind, endpoint.model, False, time.monotonic() - started)
+                last_error = e
+                continue
+            endpoint_resolver.remember(endpoint)
+            ok = False
+            usage: dict | None = None
+            try:
+                async for line in response.aiter_lines():
+                    _attempt_timeout()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if not data:
+                        continue
+                    body = json.loads(data)
+                    # トークン数は最後のチャンクの usageMetadata が累計になっている
+                    usage = body.get("usageMetadata") or usage
+                    parts = body.get("candidates", [{}])[0].get("content", {}).get("parts", [])
+                    chunk = "".join(part.get("text", "") for part in parts)
+                    if chunk:
+                        yield chunk
+                ok = True
+            finally:
+                usage_recorder.record_call(kind, endpoint.model, ok, time.monotonic() - started, usage)
+            return
+    if last_error:
+        raise last_error
+    raise ValueError("No available Gemini model/endpoint was found (404).")
@@ -0,0 +1,98 @@
+import datetime as dt
+from collections.abc import Iterable
+
+from sqlalchemy import and_, case, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.task import Task, TaskType
+from app.schemas.plan import GoalPlan, PlanDay, PlanMonth, PlanTask, PlanWeek
+from app.services.task_service import parse_note_subtasks
+
+# 月次 → 週次 → 日次の順に読むと、親のノードが子より先にできる
+_TYPE_RANK = case({TaskType.monthly: 0, TaskType.weekly: 1, TaskType.daily: 2}, value=Task.type)
+
+
+def _window_weeks_and_months(start: dt.date, end: dt.date) -> tuple[set[int], set[int]]:
+    # 週番号・月には年がないので、1年を超える期間はすべての週・月にかかる
+    if (end - start).days >= 371:
+        return set(range(1, 54)), set(range(1, 13))
+    days = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+    return {day.isocalendar().week for day in days}, {day.month for day in days}
+
+
+def plan_query(goal_id: int, start: dt.date | None = None, end: dt.date | None = None):
+    """
+    目標のタスクを1回で読むクエリ。start / end を指定すると日次はその期間だけにする。
+    両方指定したときは、期間にかかる週の週次タスクと、期間にかかる月の月次タスクだけに絞る。
+    """
+    stmt = select(*Task.__table__.columns).where(Task.goal_id == goal_id)
+    daily = [Task.type == TaskType.daily]
+    if start is not None:
+        daily.append(Task.date >= start)
+    if end is not None:
+        daily.append(Task.date <= end)
+    if start is not None and end is not None:
+        weeks, months = _window_weeks_and_months(start, end)
+        stmt = stmt.where(
+            or_(
+                and_(*daily),
+                and_(Task.type == TaskType.weekly, Task.week_number.in_(weeks)),
+                and_(Task.type == TaskType.monthly, or_(Task.month.in_(months), Task.month.is_(None))),
+            )
+        )
+    elif start is not None or end is not None:
+        stmt = stmt.where(or_(Task.type != TaskType.daily, and_(*daily)))
+    return stmt.order_by(_TYPE_RANK, Task.date, Task.id)
+
+
+def build_plan(goal_id: int, rows: Iterable[dict], start: dt.date | None = None, end: dt.date | None = None) -> GoalPlan:
+    """plan_query の並び順の行を1回なめて、月 → 週 → 日の木を組み立てる。"""
+    plan = GoalPlan(goal_id=goal_id, start=start, end=end, task_count=0)
+    months: dict[int | None, PlanMonth] = {}
+    weeks: dict[int, PlanWeek] = {}
+    days: dict[dt.date, PlanDay] = {}
+
+    def month_node(month: int | None) -> PlanMonth:
+        node = months.get(month)
+        if node is None:
+            node = months[month] = PlanMonth(month=month)
+            plan.months.append(node)
+        return node
+
+    def week_node(week_number: int, month: int | None) -> PlanWeek:
+        node = weeks.get(week_number)
+        if node is None:
+            node = weeks[week_number] = PlanWeek(week_number=week_number)
+            month_node(month).weeks.append(node)
+        return node
+
+    for row in rows:
+        task = PlanTask.model_validate({**row, "subtasks": parse_note_subtasks(row["note"])})
+        plan.task_count += 1
+        if task.type == TaskType.monthly:
+            if task.month is None:
+                plan.milestones.append(task)
+            else:
+                month_node(task.month).tasks.append(task)
+        elif task.type == TaskType.weekly:
+            if task.week_number is None:
+                plan.unscheduled.append(task)
+            else:
+                week_node(task.week_number, task.month).tasks.append(task)
+        elif task.date is None:
+            plan.unscheduled.append(task)
+        else:
+            day = days.get(task.date)
+            if day is None:
+                week_number = task.week_number or task.date.isocalendar().week
+                day = days[task.date] = PlanDay(date=task.date)
+                week_node(week_number, task.month or task.date.month).days.append(day)
+            day.tasks.append(task)
+    return plan
+
+
+async def load_goal_plan(
+    db: AsyncSession, goal_id: int, start: dt.date | None = None, end: dt.date | None = None
+) -> GoalPlan:
+    result = await db.execute(plan_query(goal_id, start, end))
+    return build_plan(goal_id, result.mappings(), start, end)
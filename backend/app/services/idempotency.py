@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+
+
+class IdempotencyConflict(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    headers: list[tuple[bytes, bytes]]
+    compressed_body: bytes
+
+    @property
+    def body(self) -> bytes:
+        return zlib.decompress(self.compressed_body)
+
+
+@dataclass
+class _Record:
+    fingerprint: str
+    created_at: float
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    response: StoredResponse | None = None
+
+
+class IdempotencyStore:
+    """
+    Idempotency-Key ごとのレスポンスを LRU + TTL で持つ（プロセス内のみ）。
+    処理中のキーに同じリクエストが来たら、先行分が終わるのを待ってその結果を返す。
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_body_bytes: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_body_bytes = max_body_bytes
+        self._records: OrderedDict[Hashable, _Record] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stored = 0
+        self.replayed = 0
+        self.waited = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.too_large = 0
+
+    async def begin(self, key: Hashable, fingerprint: str, timeout: float) -> StoredResponse | None:
+        """保存済みならそのレスポンス、なければキーを処理中にして None を返す（呼び出し元が実行する）。"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                record = self._records.get(key)
+                if record is not None and record.response is not None:
+                    if time.monotonic() - record.created_at > self.ttl_seconds:
+                        del self._records[key]
+                        self.expirations += 1
+                        record = None
+                if record is None:
+                    self._records[key] = _Record(fingerprint=fingerprint, created_at=time.monotonic())
+                    self._evict()
+                    return None
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyConflict(422, "Idempotency-Key was already used with a different request")
+                if record.response is not None:
+                    self._records.move_to_end(key)
+                    self.replayed += 1
+                    return record.response
+                self.waited += 1
+            # 先行リクエストが終わるか、失敗して解放されたらやり直す
+            try:
+                await asyncio.wait_for(record.done.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+
+    def complete(self, key: Hashable, status_code: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+        compressed = zlib.compress(body)
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                return
+            if len(compressed) > self.max_body_bytes:
+                self.too_large += 1
+                del self._records[key]
+            else:
+                record.response = StoredResponse(status_code, headers, compressed)
+                record.created_at = time.monotonic()
+                self.stored += 1
+        record.done.set()
+
+    def release(self, key: Hashable) -> None:
+        """失敗したリクエストは保存せず、待っているリトライに実行を譲る。"""
+        with self._lock:
+            record = self._records.pop(key, None)
+        if record is not None:
+            record.done.set()
+
+    def _evict(self) -> None:
+        # 期限切れは参照時に消す。ここでは件数だけを見て、処理中のものは追い出さない
+        while len(self._records) > self.max_entries:
+            oldest = next((k for k, r in self._records.items() if r.response is not None), None)
+            if oldest is None:
+                break
+            del self._records[oldest]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._records),
+                "in_flight": sum(1 for r in self._records.values() if r.response is None),
+                "bytes": sum(len(r.response.compressed_body) for r in self._records.values() if r.response),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "stored": self.stored,
+                "replayed": self.replayed,
+                "waited": self.waited,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "too_large": self.too_large,
+            }
+
+
+idempotency_store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_body_bytes=settings.IDEMPOTENCY_MAX_BODY_BYTES,
+)
@@ -0,0 +1,37 @@
+from sqlalchemy import case, func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.task import Task, TaskType
+from app.models.user import User
+from app.schemas.ranking import RankingItem
+
+
+async def weekly_ranking(db: AsyncSession, target_ids: list[int], week: int, top_n: int = 3) -> list[RankingItem]:
+    """その週の日次タスクの達成率で並べる。ユーザーごとの件数は1回の GROUP BY でまとめて数える。"""
+    users = list(await db.scalars(select(User).where(User.id.in_(target_ids))))
+    counts = await db.execute(
+        select(Task.user_id, func.count(), func.sum(case((Task.is_done == true(), 1), else_=0)))
+        .where(
+            Task.user_id.in_(target_ids),
+            Task.type == TaskType.daily,
+            Task.week_number == week,
+        )
+        .group_by(Task.user_id)
+    )
+    totals = {row_user_id: (total, done or 0) for row_user_id, total, done in counts}
+
+    ranking_items: list[RankingItem] = []
+    for user in users:
+        total, done = totals.get(user.id, (0, 0))
+        achieved_rate = (done / total) if total > 0 else 0.0
+        ranking_items.append(
+            RankingItem(
+                user_id=user.id,
+                user_name=user.name,
+                achieved_avg=float(achieved_rate),
+                avatar_url=user.avatar_url,
+            )
+        )
+
+    ranking_items.sort(key=lambda item: item.achieved_avg, reverse=True)
+    return ranking_items[:top_n] if top_n > 0 else ranking_items
@@ -0,0 +1,192 @@
+import datetime as dt
+from collections.abc import Iterable
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.goal import Goal
+from app.models.revision_session import RevisionSession
+from app.models.task import Task
+from app.models.user import User
+from app.schemas.revision_session import RevisionSessionRead, RevisionSessionTurn
+from app.schemas.task import DraftTask, RevisionChatMessage, RevisionChatResponse, TaskRead
+from app.services.ai_usage import usage_scope
+from app.services.task_service import generate_revision_suggestions, parse_note_subtasks
+
+SUMMARY_SNIPPET_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """トークン数の概算。日本語などの非 ASCII は1文字1トークン、ASCII は4文字1トークンとみなす。"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def apply_draft_delta(draft: list[dict], upserted: Iterable[DraftTask], removed_ids: Iterable[int]) -> list[dict]:
+    """task_id 単位で差分を当てる。既存の並び順は保ち、新しいタスクは末尾に足す。"""
+    by_id = {item["task_id"]: item for item in draft}
+    order = [item["task_id"] for item in draft]
+    for task in upserted:
+        if task.task_id not in by_id:
+            order.append(task.task_id)
+        by_id[task.task_id] = jsonable_encoder(task)
+    removed = set(removed_ids)
+    return [by_id[task_id] for task_id in order if task_id not in removed]
+
+
+def fold_history(
+    history: list[dict],
+    summary: str | None,
+    token_budget: int | None = None,
+    summary_max_chars: int | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    新しい発言から順に token_budget に収まる分だけ残し、あふれた古い発言は要約に畳み込む。
+    要約は各発言の先頭だけを並べた抜粋で、summary_max_chars を超えたら古い側から切り捨てる。
+    """
+    token_budget = settings.REVISION_HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+    summary_max_chars = settings.REVISION_SUMMARY_MAX_CHARS if summary_max_chars is None else summary_max_chars
+
+    kept: list[dict] = []
+    used = 0
+    for message in reversed(history):
+        cost = estimate_tokens(message["content"])
+        # 直近の1件は予算を超えても残す
+        if kept and used + cost > token_budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+
+    folded = history[: len(history) - len(kept)]
+    if not folded:
+        return kept, summary
+
+    parts = [summary] if summary else []
+    for message in folded:
+        speaker = "ユーザー" if message["role"] == "user" else "アシスタント"
+        parts.append(f"{speaker}: {message['content'][:SUMMARY_SNIPPET_CHARS]}")
+    merged = " / ".join(parts)
+    if len(merged) > summary_max_chars:
+        merged = "…" + merged[-(summary_max_chars - 1) :]
+    return kept, merged
+
+
+def draft_from_task(task: Task | TaskRead) -> DraftTask:
+    return DraftTask(
+        task_id=task.id,
+        task_type=task.type,
+        title=task.title,
+        note=task.note,
+        subtasks=parse_note_subtasks(task.note),
+        status=task.status,
+        priority=task.priority,
+        date=task.date,
+        month=task.month,
+        week_number=task.week_number,
+    )
+
+
+def to_session_read(session: RevisionSession) -> RevisionSessionRead:
+    return RevisionSessionRead(
+        goal_id=session.goal_id,
+        task_count=len(session.draft or []),
+        history_turns=len(session.history or []),
+        summary=session.summary,
+        version=session.version,
+        updated_at=session.updated_at,
+    )
+
+
+def get_revision_session(db: Session, goal: Goal, user_id: int) -> RevisionSession:
+    session = db.get(RevisionSession, goal.id)
+    if session is None or session.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Revision session not found")
+    return session
+
+
+def start_revision_session(db: Session, goal: Goal, user_id: int, draft_tasks: list[DraftTask]) -> RevisionSession:
+    """ドラフト全体を一度だけ受け取ってセッションを作る。既存セッションは会話ごと作り直す。"""
+    now = dt.datetime.utcnow()
+    session = db.get(RevisionSession, goal.id)
+    if session is None:
+        session = RevisionSession(goal_id=goal.id, created_at=now, version=0)
+        db.add(session)
+    session.user_id = user_id
+    session.draft = apply_draft_delta([], draft_tasks, [])
+    session.history = []
+    session.summary = None
+    session.version = (session.version or 0) + 1
+    session.updated_at = now
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def delete_revision_session(db: Session, goal: Goal, user_id: int) -> None:
+    session = get_revision_session(db, goal, user_id)
+    db.delete(session)
+    db.commit()
+
+
+def _save_turn(db: Session, goal_id: int, version: int, draft: list[dict], history: list[dict], summary: str | None) -> None:
+    saved = db.execute(
+        update(RevisionSession)
+        .where(RevisionSession.goal_id == goal_id, RevisionSession.version == version)
+        .values(
+            draft=draft,
+            history=history,
+            summary=summary,
+            version=version + 1,
+            updated_at=dt.datetime.utcnow(),
+        )
+    )
+    db.commit()
+    if saved.rowcount == 0:
+        raise HTTPException(status_code=409, detail="Revision session was updated by another request")
+
+
+def _load_turn(db: Session, goal: Goal, user_id: int) -> tuple[int, list[dict], list[dict], str | None]:
+    """セッションの中身を写し取り、Gemini を待つ間は接続を持たないようセッションを閉じる（保存は _save_turn の version で突き合わせる）。"""
+    session = get_revision_session(db, goal, user_id)
+    snapshot = (session.version, list(session.draft or []), list(session.history or []), session.summary)
+    db.close()
+    return snapshot
+
+
+async def run_revision_turn(
+    db: Session, goal: Goal, current_user: User, payload: RevisionSessionTurn
+) -> RevisionChatResponse:
+    """差分を当てたドラフトと、予算内に畳んだ履歴＋要約だけでプロンプトを組む。"""
+    version, draft, history, summary = await run_in_threadpool(_load_turn, db, goal, current_user.id)
+    draft = apply_draft_delta(draft, payload.upserted_tasks, payload.removed_task_ids)
+
+    with usage_scope(current_user.id, current_user.is_premium):
+        response = await generate_revision_suggestions(
+            goal_title=goal.title,
+            message=payload.message,
+            draft_tasks=[DraftTask.model_validate(item) for item in draft],
+            chat_history=[RevisionChatMessage.model_validate(item) for item in history],
+            history_summary=summary,
+        )
+
+    history.append({"role": "user", "content": payload.message})
+    history.append({"role": "assistant", "content": response.assistant_message})
+    history, summary = fold_history(history, summary)
+    await run_in_threadpool(_save_turn, db, goal.id, version, draft, history, summary)
+    return response
+
+
+def sync_session_draft(db: Session, goal_id: int, tasks: list[Task] | list[TaskRead]) -> None:
+    """提案の適用後、セッションのドラフトも DB の内容に合わせる（クライアントが差分を送り直さなくて済む）。"""
+    session = db.get(RevisionSession, goal_id)
+    if session is None or not tasks:
+        return
+    session.draft = apply_draft_delta(session.draft or [], [draft_from_task(task) for task in tasks], [])
+    session.version = session.version + 1
+    session.updated_at = dt.datetime.utcnow()
+    db.commit()
@@ -0,0 +1,147 @@
+"""
+POST /tasks/batch の中身。対象を1回で読み、操作は順番どおりメモリ上の行に当て、
+最後に DELETE 1文と主キー指定の一括 UPDATE で書き戻して1回だけ commit する。
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.models.task import Task, TaskStatus, TaskType
+from app.schemas.task import TaskBatchOperation, TaskBatchResponse, TaskBatchResult
+from app.services.task_writer import update_tasks
+
+# 持ち越し先に同じ内容のタスクがあれば統合する（carry_over.py の _same_task と同じ列）
+_SAME_TASK_KEYS = ("user_id", "goal_id", "title", "tags", "note")
+
+
+class BatchOperationError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _load(db: Session, *conditions) -> dict[int, dict]:
+    result = db.execute(select(*Task.__table__.columns).where(*conditions))
+    return {row["id"]: dict(row) for row in result.mappings()}
+
+
+class _TaskBatch:
+    def __init__(self, rows: dict[int, dict]):
+        self.rows = rows
+        self.changed: dict[int, set[str]] = {}
+        self.deleted: set[int] = set()
+
+    def get(self, task_id: int) -> dict:
+        row = self.rows.get(task_id)
+        if row is None or task_id in self.deleted:
+            raise BatchOperationError(404, "Task not found")
+        return row
+
+    def assign(self, row: dict, **values) -> None:
+        row.update(values)
+        self.changed.setdefault(row["id"], set()).update(values)
+
+    def toggle(self, row: dict) -> int:
+        is_done = not row["is_done"]
+        self.assign(row, is_done=is_done, status=TaskStatus.done if is_done else TaskStatus.todo)
+        return row["id"]
+
+    def update(self, row: dict, operation: TaskBatchOperation) -> int:
+        if operation.changes is None:
+            raise BatchOperationError(400, "changes is required for update")
+        updates = operation.changes.model_dump(exclude_none=True)
+        # PUT /tasks/{id} と同じく、完了済みの日次タスクは日付を動かせない
+        if row["type"] == TaskType.daily and row["is_done"] and "date" in updates and updates["date"] != row["date"]:
+            raise BatchOperationError(400, "Completed daily task cannot be carried over")
+        if updates:
+            self.assign(row, **updates)
+        return row["id"]
+
+    def carry_over(self, row: dict) -> int:
+        if row["type"] != TaskType.daily or row["date"] is None:
+            raise BatchOperationError(400, "Carry-over is only for daily tasks")
+        if row["is_done"]:
+            raise BatchOperationError(400, "Completed task cannot be carried over")
+        target_date = row["date"] + timedelta(days=1)
+        duplicate = next(
+            (
+                other
+                for other in self.rows.values()
+                if other["id"] != row["id"]
+                and other["id"] not in self.deleted
+                and other["type"] == TaskType.daily
+                and other["date"] == target_date
+                and all(other[key] == row[key] for key in _SAME_TASK_KEYS)
+            ),
+            None,
+        )
+        if duplicate is not None:
+            self.assign(duplicate, carried_over=True, is_done=False)
+            self.delete(row)
+            return duplicate["id"]
+        self.assign(row, date=target_date, carried_over=True)
+        return row["id"]
+
+    def delete(self, row: dict) -> None:
+        self.deleted.add(row["id"])
+        self.changed.pop(row["id"], None)
+
+
+def apply_task_batch(
+    db: Session, user_id: int, operations: list[TaskBatchOperation], atomic: bool = False
+) -> TaskBatchResponse:
+    """
+    operations を順番に当てる。他人のタスクや、前の操作で削除したタスクは 404 扱い。
+    atomic でなければ失敗した操作だけを飛ばし、成功分はまとめて commit する。
+    """
+    rows = _load(db, Task.id.in_({operation.task_id for operation in operations}), Task.user_id == user_id)
+    if any(operation.op == "carry_over" for operation in operations):
+        # 持ち越し先の重複候補（同じタイトルの日次タスク）も同じ読み込みでそろえておく
+        titles = {row["title"] for row in rows.values()}
+        titles |= {op.changes.title for op in operations if op.op == "update" and op.changes and op.changes.title}
+        if titles:
+            candidates = _load(db, Task.user_id == user_id, Task.type == TaskType.daily, Task.title.in_(titles))
+            for task_id, row in candidates.items():
+                rows.setdefault(task_id, row)
+
+    batch = _TaskBatch(rows)
+    results: list[TaskBatchResult] = []
+    for index, operation in enumerate(operations):
+        status_code, detail, result_task_id = 200, None, None
+        try:
+            row = batch.get(operation.task_id)
+            if operation.op == "toggle":
+                result_task_id = batch.toggle(row)
+            elif operation.op == "update":
+                result_task_id = batch.update(row, operation)
+            elif operation.op == "carry_over":
+                result_task_id = batch.carry_over(row)
+            else:
+                batch.delete(row)
+                status_code = 204
+        except BatchOperationError as e:
+            status_code, detail = e.status_code, e.detail
+        results.append(
+            TaskBatchResult(
+                index=index,
+                op=operation.op,
+                task_id=operation.task_id,
+                status_code=status_code,
+                detail=detail,
+                result_task_id=result_task_id,
+            )
+        )
+
+    if atomic and any(result.detail is not None for result in results):
+        db.rollback()
+        return TaskBatchResponse(committed=False, results=results, tasks=[], deleted_ids=[])
+
+    if batch.deleted:
+        db.execute(delete(Task).where(Task.id.in_(batch.deleted)).execution_options(synchronize_session=False))
+    fields = sorted(set().union(*batch.changed.values()))
+    tasks = update_tasks(db, [rows[task_id] for task_id in batch.changed], fields, commit=False)
+    db.commit()
+    return TaskBatchResponse(committed=True, results=results, tasks=tasks, deleted_ids=sorted(batch.deleted))
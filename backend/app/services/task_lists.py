@@ -0,0 +1,32 @@
+import datetime as dt
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.utils.pagination import PageParams, SortKey, page_query, split_page
+from app.core.config import settings
+from app.models.task import Task, TaskType
+from app.schemas.task import TaskRead
+
+GOAL_TASK_ORDER = [SortKey(Task.type), SortKey(Task.date, nullable=True), SortKey(Task.id)]
+TASK_LIST_ORDER = [SortKey(Task.created_at, descending=True), SortKey(Task.id, descending=True)]
+
+# 1日・1週・1月分のタスクなので、種類ごとに PAGE_MAX_LIMIT 件あれば足りる
+_TODAY_TASKS = PageParams(cursor=None, limit=3 * settings.PAGE_MAX_LIMIT)
+
+
+async def today_tasks(db: AsyncSession, user_id: int, day: dt.date) -> dict[TaskType, list[TaskRead]]:
+    """その日の日次・その週の週次・その月の月次を1回のクエリで読み、種類ごとに分ける。"""
+    stmt = select(Task).where(
+        Task.user_id == user_id,
+        or_(
+            and_(Task.type == TaskType.daily, Task.date == day),
+            and_(Task.type == TaskType.weekly, Task.week_number == day.isocalendar().week),
+            and_(Task.type == TaskType.monthly, Task.month == day.month),
+        ),
+    )
+    rows, _ = split_page(list(await db.scalars(page_query(stmt, TASK_LIST_ORDER, _TODAY_TASKS))), TASK_LIST_ORDER, _TODAY_TASKS)
+    grouped: dict[TaskType, list[TaskRead]] = {task_type: [] for task_type in TaskType}
+    for task in rows:
+        grouped[task.type].append(TaskRead.model_validate(task))
+    return grouped
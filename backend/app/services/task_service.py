@@ -1,4 +1,6 @@
+import asyncio
 import datetime as dt
+import hashlib
 import json
 import logging
 import math
@@ -6,14 +8,14 @@ import re
 import uuid
 from collections.abc import Sequence
 
-import httpx
-from fastapi import HTTPException
-from sqlalchemy import func
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
+from app.db.session import SessionLocal
 from app.models.goal import Goal
-from app.models.task import TaskType
+from app.models.task import Task, TaskType
 from app.models.user import User
 from app.schemas.task import (
     BreakdownResponse,
@@ -21,8 +23,14 @@ from app.schemas.task import (
     DraftTask,
     RevisionChatMessage,
     RevisionChatResponse,
+    TaskRead,
     TaskRevisionProposal,
 )
+from app.services.ai_usage import release_free_breakdown, reserve_free_breakdown, usage_scope
+from app.services.breakdown_cache import breakdown_cache, breakdown_cache_key
+from app.services.gemini_client import build_json_payload, extract_text, gemini_deadline, generate_json
+from app.services.singleflight import SingleFlight
+from app.services.task_writer import insert_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -137,61 +145,39 @@ def _fallback_daily_details(title: str) -> list[str]:
     ]
 
 
-def _request_gemini_daily_details(daily_titles: list[str]) -> list[list[str]]:
+def _parse_json_object(text: str) -> dict:
+    cleaned = text.strip()
+    cleaned = re.sub(r"^```json\s*", "", cleaned)
+    cleaned = re.sub(r"```$", "", cleaned).strip()
+    if cleaned.startswith("{") and cleaned.endswith("}"):
+        return json.loads(cleaned)
+    start = cleaned.find("{")
+    end = cleaned.rfind("}")
+    if start != -1 and end != -1:
+        return json.loads(cleaned[start : end + 1])
+    raise ValueError("Gemini response is not valid JSON")
+
+
+def _parse_body_json(body: dict) -> dict:
+    return _parse_json_object(extract_text(body))
+
+
+def _parse_details_body(body: dict) -> dict:
+    parsed = _parse_body_json(body)
+    if not isinstance(parsed.get("details"), list):
+        raise ValueError("Gemini daily details format invalid")
+    return parsed
+
+
+async def _request_gemini_daily_details(daily_titles: list[str]) -> list[list[str]]:
     prompt = (
         "次の日次タスクごとに、実行可能な詳細TODOを3件ずつ作ってください。"
         "JSONのみ返答。形式は"
         '{"details":[["todo1","todo2","todo3"], ...]}。\n'
         f"日次タスク: {json.dumps(daily_titles, ensure_ascii=False)}"
     )
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.6,
-            "response_mime_type": "application/json",
-        },
-    }
-    model_candidates = [
-        settings.GEMINI_MODEL,
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash-latest",
-        "gemini-1.5-flash",
-    ]
-    model_candidates = list(dict.fromkeys(model_candidates))
-    base_versions = ["v1beta", "v1"]
-
-    body: dict | None = None
-    for version in base_versions:
-        for model in model_candidates:
-            url = (
-                f"https://generativelanguage.googleapis.com/{version}/models/"
-                f"{model}:generateContent?key={settings.GEMINI_API_KEY}"
-            )
-            response = httpx.post(url, json=payload, timeout=90.0)
-            if response.status_code == 404:
-                continue
-            response.raise_for_status()
-            body = response.json()
-            break
-        if body is not None:
-            break
-    if body is None:
-        raise ValueError("No available Gemini model/endpoint was found (404).")
-
-    text = (
-        body.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "{}")
-    )
-    cleaned = text.strip()
-    cleaned = re.sub(r"^```json\s*", "", cleaned)
-    cleaned = re.sub(r"```$", "", cleaned).strip()
-    parsed = json.loads(cleaned)
-    raw_details = parsed.get("details")
-    if not isinstance(raw_details, list):
-        raise ValueError("Gemini daily details format invalid")
+    parsed = await generate_json(build_json_payload(prompt), _parse_details_body, kind="daily_details")
+    raw_details = parsed["details"]
 
     result: list[list[str]] = []
     for idx, item in enumerate(raw_details):
@@ -203,17 +189,17 @@ def _request_gemini_daily_details(daily_titles: list[str]) -> list[list[str]]:
     return result
 
 
-def _request_gemini_breakdown(
+def breakdown_prompt(
     goal_title: str,
     months: int,
     weeks_per_month: int,
     days_per_week: int,
     deadline: dt.date | None = None,
     current_situation: str | None = None,
-):
+) -> str:
     deadline_text = deadline.isoformat() if deadline else "未設定"
     current_text = current_situation.strip() if current_situation else "未入力"
-    prompt = (
+    return (
         "あなたは目標分解のプロです。以下をJSONのみで返してください。\n"
         "ルール:\n"
         f"- monthly: 今月を1番目とした直近{months}ヶ月の目標配列（必ず{months}件）。1件目=今月、2件目=来月、…、N件目=Nヶ月後\n"
@@ -239,119 +225,21 @@ def _request_gemini_breakdown(
         "開始日（今日）から7日間、1日ずつのdailyタスクとして作成してください。"
     )
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.6,
-            "response_mime_type": "application/json",
-        },
-    }
-    model_candidates = [
-        settings.GEMINI_MODEL,
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash-latest",
-        "gemini-1.5-flash",
-    ]
-    model_candidates = list(dict.fromkeys(model_candidates))
-    base_versions = ["v1beta", "v1"]
-
-    last_error: Exception | None = None
-    body: dict | None = None
-    for version in base_versions:
-        for model in model_candidates:
-            url = (
-                f"https://generativelanguage.googleapis.com/{version}/models/"
-                f"{model}:generateContent?key={settings.GEMINI_API_KEY}"
-            )
-            response = httpx.post(url, json=payload, timeout=90.0)
-            if response.status_code == 404:
-                continue
-            try:
-                response.raise_for_status()
-                body = response.json()
-                break
-            except Exception as e:
-                last_error = e
-                continue
-        if body is not None:
-            break
-
-    if body is None:
-        if last_error:
-            raise last_error
-        raise ValueError("No available Gemini model/endpoint was found (404).")
-    text = (
-        body.get("candidates", [{}])[0]
-        .get("content", {})
-        .get("parts", [{}])[0]
-        .get("text", "{}")
-    )
-    cleaned = text.strip()
-    cleaned = re.sub(r"^```json\s*", "", cleaned)
-    cleaned = re.sub(r"```$", "", cleaned).strip()
-    if cleaned.startswith("{") and cleaned.endswith("}"):
-        return json.loads(cleaned)
-    start = cleaned.find("{")
-    end = cleaned.rfind("}")
-    if start != -1 and end != -1:
-        return json.loads(cleaned[start : end + 1])
-    raise ValueError("Gemini response is not valid JSON")
 
+async def _request_gemini_breakdown(
+    goal_title: str,
+    months: int,
+    weeks_per_month: int,
+    days_per_week: int,
+    deadline: dt.date | None = None,
+    current_situation: str | None = None,
+):
+    prompt = breakdown_prompt(goal_title, months, weeks_per_month, days_per_week, deadline, current_situation)
+    return await generate_json(build_json_payload(prompt), _parse_body_json, kind="breakdown")
 
-def _call_gemini_json(prompt: str) -> dict:
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.6,
-            "response_mime_type": "application/json",
-        },
-    }
-    model_candidates = [
-        settings.GEMINI_MODEL,
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash-latest",
-        "gemini-1.5-flash",
-    ]
-    model_candidates = list(dict.fromkeys(model_candidates))
-    base_versions = ["v1beta", "v1"]
-    last_error: Exception | None = None
-
-    for version in base_versions:
-        for model in model_candidates:
-            url = (
-                f"https://generativelanguage.googleapis.com/{version}/models/"
-                f"{model}:generateContent?key={settings.GEMINI_API_KEY}"
-            )
-            response = httpx.post(url, json=payload, timeout=90.0)
-            if response.status_code == 404:
-                continue
-            try:
-                response.raise_for_status()
-            except Exception as e:
-                last_error = e
-                continue
-            body = response.json()
-            text = (
-                body.get("candidates", [{}])[0]
-                .get("content", {})
-                .get("parts", [{}])[0]
-                .get("text", "{}")
-            )
-            cleaned = text.strip()
-            cleaned = re.sub(r"^```json\s*", "", cleaned)
-            cleaned = re.sub(r"```$", "", cleaned).strip()
-            if cleaned.startswith("{") and cleaned.endswith("}"):
-                return json.loads(cleaned)
-            start = cleaned.find("{")
-            end = cleaned.rfind("}")
-            if start != -1 and end != -1:
-                return json.loads(cleaned[start : end + 1])
-            raise ValueError("Gemini response is not valid JSON")
-    if last_error:
-        raise last_error
-    raise ValueError("No available Gemini model/endpoint was found (404).")
+
+async def _call_gemini_json(prompt: str) -> dict:
+    return await generate_json(build_json_payload(prompt), _parse_body_json, kind="revision")
 
 
 def parse_note_subtasks(note: str | None) -> list[str]:
@@ -368,29 +256,7 @@ def compose_note_subtasks(subtasks: list[str]) -> str:
     return "\n".join([f"- {item.strip()}" for item in subtasks if item.strip()])
 
 
-def generate_revision_suggestions(
-    goal_title: str,
-    message: str,
-    draft_tasks: list[DraftTask],
-    chat_history: list[RevisionChatMessage],
-) -> RevisionChatResponse:
-    if not draft_tasks:
-        return RevisionChatResponse(
-            source="fallback",
-            assistant_message="編集中のタスクが見つかりません。",
-            proposals=[],
-        )
-
-    if not settings.GEMINI_API_KEY:
-        return RevisionChatResponse(
-            source="fallback",
-            assistant_message="Geminiキー未設定のため提案を作成できません。",
-            proposals=[],
-        )
-
-    today_ref = dt.date.today()
-    today_iso = today_ref.isoformat()
-
+def _draft_payload(draft_tasks: Sequence[DraftTask]) -> list[dict]:
     draft_payload = []
     for task in draft_tasks:
         item = {
@@ -406,10 +272,20 @@ def generate_revision_suggestions(
         if getattr(task, "week_number", None) is not None:
             item["week_number"] = task.week_number
         draft_payload.append(item)
+    return draft_payload
 
-    history_payload = [{"role": m.role, "content": m.content} for m in chat_history]
 
-    prompt = (
+def revision_prompt(
+    goal_title: str,
+    message: str,
+    draft_tasks: Sequence[DraftTask],
+    history_payload: list[dict],
+    today_iso: str,
+    history_summary: str | None = None,
+    shard_note: str | None = None,
+) -> str:
+    draft_payload = _draft_payload(draft_tasks)
+    return (
         "あなたはタスク編集アシスタントです。ユーザーが入力したテキストに基づき、"
         "**最終目標（長期目標）・月次(monthly)・週次(weekly)・日次(daily)タスクのうち、修正が必要なもの**を提案してください。"
         "JSONのみで返してください。\n\n"
@@ -449,38 +325,53 @@ def generate_revision_suggestions(
         '形式: {"assistant_message":"...","proposals":[{"target_task_id":<数値>,"target_type":"monthly"|"weekly"|"daily"|"subtask","before":"現在の文言","after":"修正後の文言","reason":"理由"},...],"new_goal_title":"..." または省略}\n\n'
         f"今日の日付（参照用）: {today_iso}\n"
         f"長期目標（最終目標）: {goal_title}\n"
-        f"会話履歴: {json.dumps(history_payload, ensure_ascii=False)}\n"
+        + (f"これまでの会話の要約: {history_summary}\n" if history_summary else "")
+        + f"会話履歴: {json.dumps(history_payload, ensure_ascii=False)}\n"
         f"ユーザーメッセージ: {message}\n"
-        f"ドラフトタスク（各タスクに date/month/week_number が含まれる場合、そのタスクの期間を示す）: {json.dumps(draft_payload, ensure_ascii=False, default=str)}"
+        + (f"{shard_note}\n" if shard_note else "")
+        + f"ドラフトタスク（各タスクに date/month/week_number が含まれる場合、そのタスクの期間を示す）: {json.dumps(draft_payload, ensure_ascii=False, default=str)}"
     )
 
-    try:
-        parsed = _call_gemini_json(prompt)
-    except Exception as e:
-        logger.exception("Gemini revision failed: %s", e)
-        return RevisionChatResponse(
-            source="fallback",
-            assistant_message="Gemini提案の生成に失敗しました。再度試してください。",
-            proposals=[],
-        )
 
-    proposals_raw = parsed.get("proposals")
-    assistant_message = str(parsed.get("assistant_message", "提案を作成しました。"))
-    new_goal_title = parsed.get("new_goal_title")
-    if isinstance(new_goal_title, str):
-        new_goal_title = new_goal_title.strip() or None
-    else:
-        new_goal_title = None
+def _task_month(task: DraftTask) -> int | None:
+    if task.month is not None:
+        return task.month
+    if task.date is not None:
+        return task.date.month
+    return None
 
-    if not isinstance(proposals_raw, list):
-        return RevisionChatResponse(
-            source="fallback",
-            assistant_message=assistant_message,
-            proposals=[],
-            new_goal_title=new_goal_title,
-        )
 
-    valid_task_map = {task.task_id: task for task in draft_tasks}
+def shard_draft_by_month(draft_tasks: Sequence[DraftTask]) -> list[list[DraftTask]]:
+    """
+    ドラフトを月ごとのまとまりに分ける。月次とその月の週次・日次は同じシャードに入るので、月内のカスケードは1回の呼び出しで完結する。
+    小さい月は REVISION_SHARD_TARGET_TASKS に達するまで隣の月とまとめる。月を持たないタスクは先頭のシャードに入れる。
+    閾値以下のドラフトは分割しない。
+    """
+    if len(draft_tasks) <= settings.REVISION_SHARD_THRESHOLD:
+        return [list(draft_tasks)]
+
+    unscoped: list[DraftTask] = []
+    months: dict[int, list[DraftTask]] = {}
+    for task in draft_tasks:
+        month = _task_month(task)
+        if month is None:
+            unscoped.append(task)
+        else:
+            months.setdefault(month, []).append(task)
+
+    shards: list[list[DraftTask]] = []
+    current: list[DraftTask] = list(unscoped)
+    for month_tasks in months.values():
+        if current and len(current) + len(month_tasks) > settings.REVISION_SHARD_TARGET_TASKS:
+            shards.append(current)
+            current = []
+        current.extend(month_tasks)
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _parse_revision_proposals(proposals_raw: list, valid_task_map: dict[int, DraftTask]) -> list[TaskRevisionProposal]:
     proposals: list[TaskRevisionProposal] = []
     for item in proposals_raw:
         if not isinstance(item, dict):
@@ -529,7 +420,76 @@ def generate_revision_suggestions(
             len(proposals_raw),
             list(valid_task_map.keys()),
         )
+    return proposals
+
+
+def _new_goal_title(parsed: dict) -> str | None:
+    new_goal_title = parsed.get("new_goal_title")
+    if isinstance(new_goal_title, str):
+        return new_goal_title.strip() or None
+    return None
+
+
+def _revision_failed() -> RevisionChatResponse:
+    return RevisionChatResponse(
+        source="fallback",
+        assistant_message="Gemini提案の生成に失敗しました。再度試してください。",
+        proposals=[],
+    )
+
+
+async def _fan_out_revision(
+    goal_title: str,
+    message: str,
+    shards: list[list[DraftTask]],
+    history_payload: list[dict],
+    today_iso: str,
+    history_summary: str | None,
+    valid_task_map: dict[int, DraftTask],
+) -> RevisionChatResponse:
+    """シャードごとの呼び出しを同時実行数を絞って並行に投げ、提案をマージする。"""
+    sem = asyncio.Semaphore(settings.REVISION_SHARD_CONCURRENCY)
+
+    async def run_shard(idx: int, shard: list[DraftTask]) -> dict:
+        months = sorted({m for m in (_task_month(task) for task in shard) if m is not None})
+        label = "・".join(f"{m}月" for m in months) or "期間指定なし"
+        shard_note = (
+            f"【分割処理】ドラフトは月ごとに {len(shards)} 分割されており、これは {idx + 1} 番目（{label}）です。"
+            "下記ドラフトに含まれるタスクだけを対象に提案すること。new_goal_title は必要な場合のみ含める。"
+        )
+        prompt = revision_prompt(
+            goal_title, message, shard, history_payload, today_iso, history_summary=history_summary, shard_note=shard_note
+        )
+        async with sem:
+            return await _call_gemini_json(prompt)
+
+    # すべてのシャードで1つの持ち時間を共有する（gather で作られるタスクは deadline のコンテキストを引き継ぐ）
+    with gemini_deadline():
+        results = await asyncio.gather(*(run_shard(idx, shard) for idx, shard in enumerate(shards)), return_exceptions=True)
+
+    parsed_results: list[dict] = []
+    for idx, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.error("Gemini revision shard %d/%d failed: %s", idx + 1, len(shards), result)
+        elif isinstance(result.get("proposals"), list):
+            parsed_results.append(result)
+    if not parsed_results:
+        return _revision_failed()
 
+    proposals: list[TaskRevisionProposal] = []
+    seen: set[tuple[int, str, int | None]] = set()
+    for parsed in parsed_results:
+        for proposal in _parse_revision_proposals(parsed["proposals"], valid_task_map):
+            key = (proposal.target_task_id, proposal.target_type, proposal.subtask_index)
+            if key in seen:
+                continue
+            seen.add(key)
+            proposals.append(proposal)
+
+    assistant_message = str(parsed_results[0].get("assistant_message", "提案を作成しました。"))
+    if len(parsed_results) < len(shards):
+        assistant_message += "（一部の期間は提案を作成できませんでした）"
+    new_goal_title = next((title for title in map(_new_goal_title, parsed_results) if title), None)
     return RevisionChatResponse(
         source="gemini",
         assistant_message=assistant_message,
@@ -538,8 +498,188 @@ def generate_revision_suggestions(
     )
 
 
-def build_breakdown(
+async def generate_revision_suggestions(
+    goal_title: str,
+    message: str,
+    draft_tasks: list[DraftTask],
+    chat_history: list[RevisionChatMessage],
+    history_summary: str | None = None,
+) -> RevisionChatResponse:
+    if not draft_tasks:
+        return RevisionChatResponse(
+            source="fallback",
+            assistant_message="編集中のタスクが見つかりません。",
+            proposals=[],
+        )
+
+    if not settings.GEMINI_API_KEY:
+        return RevisionChatResponse(
+            source="fallback",
+            assistant_message="Geminiキー未設定のため提案を作成できません。",
+            proposals=[],
+        )
+
+    today_iso = dt.date.today().isoformat()
+    history_payload = [{"role": m.role, "content": m.content} for m in chat_history]
+    valid_task_map = {task.task_id: task for task in draft_tasks}
+
+    shards = shard_draft_by_month(draft_tasks)
+    if len(shards) > 1:
+        return await _fan_out_revision(
+            goal_title, message, shards, history_payload, today_iso, history_summary, valid_task_map
+        )
+
+    prompt = revision_prompt(goal_title, message, draft_tasks, history_payload, today_iso, history_summary=history_summary)
+    try:
+        with gemini_deadline():
+            parsed = await _call_gemini_json(prompt)
+    except Exception as e:
+        logger.exception("Gemini revision failed: %s", e)
+        return _revision_failed()
+
+    proposals_raw = parsed.get("proposals")
+    assistant_message = str(parsed.get("assistant_message", "提案を作成しました。"))
+    new_goal_title = _new_goal_title(parsed)
+
+    if not isinstance(proposals_raw, list):
+        return RevisionChatResponse(
+            source="fallback",
+            assistant_message=assistant_message,
+            proposals=[],
+            new_goal_title=new_goal_title,
+        )
+
+    return RevisionChatResponse(
+        source="gemini",
+        assistant_message=assistant_message,
+        proposals=_parse_revision_proposals(proposals_raw, valid_task_map),
+        new_goal_title=new_goal_title,
+    )
+
+
+def persist_breakdown(
     db: Session,
+    goal: Goal,
+    breakdown: BreakdownResponse,
+    replace_existing: bool = True,
+    commit: bool = True,
+) -> list[TaskRead]:
+    """
+    分解結果をタスクとして保存する。日次の詳細TODOはそれぞれ独立した日次タスクにする。
+    削除と一括 INSERT を1トランザクションで行う（commit=False なら呼び出し側の commit に含める）。
+    """
+    if replace_existing:
+        # 同じ目標の再生成でタスク重複が増えないように既存を消してから再作成
+        db.execute(delete(Task).where(Task.goal_id == goal.id))
+    rows: list[dict] = []
+    for item in breakdown.monthly + breakdown.weekly + breakdown.daily:
+        if item.type == TaskType.daily:
+            subtasks = parse_note_subtasks(item.note)
+            if subtasks:
+                for subtask in subtasks:
+                    rows.append(
+                        {
+                            "goal_id": goal.id,
+                            "user_id": goal.user_id,
+                            "type": item.type,
+                            "title": subtask,
+                            "month": item.month,
+                            "week_number": item.week_number,
+                            "date": item.date,
+                            "note": None,
+                        }
+                    )
+                continue
+        rows.append({"goal_id": goal.id, "user_id": goal.user_id, **item.model_dump()})
+    return insert_tasks(db, rows, commit=commit)
+
+
+def yearly_milestone_items(goal: Goal, months: int, yearly_milestones: int) -> list[BreakdownTask]:
+    items: list[BreakdownTask] = []
+    for year_idx in range(yearly_milestones):
+        year_no = year_idx + 1
+        months_in_this_year = max(0, min(12, months - (year_idx * 12)))
+        items.append(
+            BreakdownTask(
+                type=TaskType.monthly,
+                title=f"{year_no}年目の目標: {goal.title}（{months_in_this_year}ヶ月計画）",
+                month=None,
+            )
+        )
+    return items
+
+
+def monthly_item(idx: int, title: str, today: dt.date) -> BreakdownTask:
+    month_value = ((today.month - 1 + idx) % 12) + 1
+    return BreakdownTask(type=TaskType.monthly, title=title, month=month_value)
+
+
+def weekly_item(idx: int, title: str, today: dt.date) -> BreakdownTask:
+    return BreakdownTask(
+        type=TaskType.weekly,
+        title=title,
+        month=today.month,
+        week_number=today.isocalendar().week + idx,
+    )
+
+
+def daily_item(idx: int, title: str, today: dt.date, detail_lines: list[str] | None = None) -> BreakdownTask:
+    day_date = today + dt.timedelta(days=idx)
+    note = "\n".join([f"- {line}" for line in detail_lines]) if detail_lines is not None else None
+    return BreakdownTask(
+        type=TaskType.daily,
+        title=title,
+        month=day_date.month,
+        week_number=day_date.isocalendar().week,
+        date=day_date,
+        note=note,
+    )
+
+
+def normalize_tier_titles(
+    goal: Goal,
+    ai: dict,
+    months: int,
+    weeks_per_month: int,
+    days_per_week: int,
+) -> tuple[list[str], list[str], list[str]]:
+    monthly_titles = [_strip_period_prefix(t) for t in _parse_titles(ai.get("monthly"), "月間マイルストーン", months)]
+    # AIが今月（1件目）を返さない場合に備え、先頭に今月分を1件補完する
+    if len(monthly_titles) >= 1 and len(monthly_titles) < months:
+        fallback_first = (goal.title or "今月の目標").strip()
+        monthly_titles = [fallback_first] + monthly_titles
+    monthly_titles = monthly_titles[:months]
+    weekly_titles = [_strip_period_prefix(t) for t in _parse_titles(ai.get("weekly"), "週次タスク", weeks_per_month)]
+    daily_titles = _parse_titles(ai.get("daily"), "デイリー行動", days_per_week)
+    return monthly_titles, weekly_titles, daily_titles
+
+
+def assemble_breakdown(
+    goal: Goal,
+    months: int,
+    yearly_milestones: int,
+    monthly_titles: list[str],
+    weekly_titles: list[str],
+    daily_titles: list[str],
+    daily_details: list[list[str]],
+    today: dt.date,
+) -> BreakdownResponse:
+    monthly = yearly_milestone_items(goal, months, yearly_milestones)
+    monthly += [monthly_item(idx, title, today) for idx, title in enumerate(monthly_titles)]
+    weekly = [weekly_item(idx, title, today) for idx, title in enumerate(weekly_titles)]
+    daily = [
+        daily_item(
+            idx,
+            title,
+            today,
+            daily_details[idx] if idx < len(daily_details) else _fallback_daily_details(title),
+        )
+        for idx, title in enumerate(daily_titles)
+    ]
+    return BreakdownResponse(source="gemini", monthly=monthly, weekly=weekly, daily=daily)
+
+
+async def build_breakdown(
     current_user: User,
     goal: Goal,
     months: int,
@@ -548,22 +688,26 @@ def build_breakdown(
     yearly_milestones: int = 0,
     current_situation: str | None = None,
 ) -> BreakdownResponse:
-    if not getattr(current_user, 'is_premium', False):
-        today_breakdowns = db.query(Goal).filter(
-            Goal.user_id == current_user.id,
-            func.date(Goal.created_at) == dt.date.today()
-        ).count()
-        if today_breakdowns > 1:
-            raise HTTPException(status_code=403, detail="FREE_LIMIT_REACHED")
-
     today = dt.date.today()
-    this_week_start = _week_start(today)
-    current_week = today.isocalendar().week
-    current_month = today.month
-
-    if settings.GEMINI_API_KEY:
+    cache_key = breakdown_cache_key(
+        goal.title,
+        current_situation,
+        goal.deadline,
+        (months, weeks_per_month, days_per_week, yearly_milestones),
+        today=today,
+    )
+    if not settings.GEMINI_API_KEY:
+        return _fallback_breakdown(goal, months, weeks_per_month, days_per_week)
+    cached = breakdown_cache.get(cache_key, today=today)
+    if cached is not None:
+        return cached
+
+    # 無料枠はキャッシュやフォールバックでは減らさず、Gemini を呼ぶ分だけ確保する
+    reserved_day = await run_in_threadpool(reserve_free_breakdown, current_user.id, current_user.is_premium)
+    # 分解と詳細TODOの2回の呼び出しで1つの持ち時間を共有する
+    with usage_scope(current_user.id, current_user.is_premium), gemini_deadline():
         try:
-            ai = _request_gemini_breakdown(
+            ai = await _request_gemini_breakdown(
                 goal.title,
                 months,
                 weeks_per_month,
@@ -573,71 +717,73 @@ def build_breakdown(
             )
         except Exception as e:
             logger.exception("Gemini breakdown failed: %s", e)
+            await run_in_threadpool(release_free_breakdown, current_user.id, reserved_day)
             return _fallback_breakdown(goal, months, weeks_per_month, days_per_week)
-    else:
-        return _fallback_breakdown(goal, months, weeks_per_month, days_per_week)
 
-    monthly_titles = [_strip_period_prefix(t) for t in _parse_titles(ai.get("monthly"), "月間マイルストーン", months)]
-    # AIが今月（1件目）を返さない場合に備え、先頭に今月分を1件補完する
-    if len(monthly_titles) >= 1 and len(monthly_titles) < months:
-        fallback_first = (goal.title or "今月の目標").strip()
-        monthly_titles = [fallback_first] + monthly_titles
-    monthly_titles = monthly_titles[:months]
-    weekly_titles = [_strip_period_prefix(t) for t in _parse_titles(ai.get("weekly"), "週次タスク", weeks_per_month)]
-    daily_titles = _parse_titles(ai.get("daily"), "デイリー行動", days_per_week)
-    if settings.GEMINI_API_KEY:
+        monthly_titles, weekly_titles, daily_titles = normalize_tier_titles(
+            goal, ai, months, weeks_per_month, days_per_week
+        )
+        details_ok = False
         try:
-            daily_details = _request_gemini_daily_details(daily_titles)
+            daily_details = await _request_gemini_daily_details(daily_titles)
+            details_ok = True
         except Exception as e:
             logger.exception("Gemini daily details failed: %s", e)
             daily_details = [_fallback_daily_details(title) for title in daily_titles]
-    else:
-        daily_details = [_fallback_daily_details(title) for title in daily_titles]
 
-    monthly: list[BreakdownTask] = []
-    weekly: list[BreakdownTask] = []
-    daily: list[BreakdownTask] = []
+    result = assemble_breakdown(
+        goal, months, yearly_milestones, monthly_titles, weekly_titles, daily_titles, daily_details, today
+    )
+    # 詳細TODOがフォールバックになった結果はキャッシュせず、次回あらためて生成する
+    if details_ok:
+        breakdown_cache.put(cache_key, result, today=today)
+    return result
 
-    for year_idx in range(yearly_milestones):
-        year_no = year_idx + 1
-        months_in_this_year = max(0, min(12, months - (year_idx * 12)))
-        monthly.append(
-            BreakdownTask(
-                type=TaskType.monthly,
-                title=f"{year_no}年目の目標: {goal.title}（{months_in_this_year}ヶ月計画）",
-                month=None,
-            )
-        )
 
-    for idx, title in enumerate(monthly_titles):
-        month_value = ((current_month - 1 + idx) % 12) + 1
-        monthly.append(
-            BreakdownTask(type=TaskType.monthly, title=title, month=month_value)
-        )
+def persist_breakdown_in_new_session(goal: Goal, breakdown: BreakdownResponse, replace_existing: bool = True) -> None:
+    # リクエストのセッションが先に閉じられても保存できるよう専用セッションを使う
+    with SessionLocal() as session:
+        persist_breakdown(session, goal, breakdown, replace_existing=replace_existing)
 
-    for idx, title in enumerate(weekly_titles):
-        weekly.append(
-            BreakdownTask(
-                type=TaskType.weekly,
-                title=title,
-                month=current_month,
-                week_number=current_week + idx,
-            )
-        )
 
-    for idx, title in enumerate(daily_titles):
-        detail_lines = daily_details[idx] if idx < len(daily_details) else _fallback_daily_details(title)
-        note = "\n".join([f"- {line}" for line in detail_lines])
-        day_date = today + dt.timedelta(days=idx)
-        daily.append(
-            BreakdownTask(
-                type=TaskType.daily,
-                title=title,
-                month=day_date.month,
-                week_number=day_date.isocalendar().week,
-                date=day_date,
-                note=note,
-            )
-        )
+breakdown_flights: SingleFlight[BreakdownResponse] = SingleFlight("breakdown")
+
 
-    return BreakdownResponse(source="gemini", monthly=monthly, weekly=weekly, daily=daily)
\ No newline at end of file
+async def coalesced_breakdown(
+    db: Session,
+    current_user: User,
+    goal: Goal,
+    months: int,
+    weeks_per_month: int,
+    days_per_week: int,
+    yearly_milestones: int = 0,
+    current_situation: str | None = None,
+    persist: bool = True,
+    replace_existing: bool = True,
+) -> BreakdownResponse:
+    """
+    同じ目標・同じ入力の分解リクエスト（ダブルクリックやリトライ）が同時に来たら、
+    生成と削除→再挿入の保存を1回だけ行い、その結果を全員に返す。
+    """
+    inputs = [goal.title, goal.deadline, months, weeks_per_month, days_per_week, yearly_milestones, current_situation]
+    raw = json.dumps(inputs + [persist, replace_existing], ensure_ascii=False, default=str)
+    key = (goal.id, hashlib.sha256(raw.encode("utf-8")).hexdigest())
+
+    async def run() -> BreakdownResponse:
+        breakdown = await build_breakdown(
+            current_user,
+            goal,
+            months,
+            weeks_per_month,
+            days_per_week,
+            yearly_milestones=yearly_milestones,
+            current_situation=current_situation,
+        )
+        if persist:
+            await run_in_threadpool(persist_breakdown_in_new_session, goal, breakdown, replace_existing)
+        return breakdown
+
+    # 要求側のセッションはここで使い終わる。相乗りして待つ間に idle in transaction の接続を抱えないよう先に返す
+    await run_in_threadpool(db.close)
+    breakdown, _ = await breakdown_flights.do(key, run)
+    return breakdown
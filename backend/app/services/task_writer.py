@@ -0,0 +1,57 @@
+import datetime as dt
+from collections.abc import Iterable
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.task import Task, TaskPriority, TaskStatus
+from app.schemas.task import TaskRead
+
+_COLUMNS = [column.key for column in Task.__table__.columns if column.key != "id"]
+
+
+def _row(values: dict, now: dt.datetime) -> dict:
+    # executemany では全行のキーをそろえる必要があるので、省略された列は既定値で埋める
+    row = {key: values.get(key) for key in _COLUMNS}
+    row["priority"] = row["priority"] or TaskPriority.mid
+    row["status"] = row["status"] or TaskStatus.todo
+    row["is_done"] = bool(row["is_done"])
+    row["carried_over"] = bool(row["carried_over"])
+    row["created_at"] = row["created_at"] or now
+    row["updated_at"] = row["updated_at"] or now
+    return row
+
+
+def insert_tasks(db: Session, values: Iterable[dict], commit: bool = True) -> list[TaskRead]:
+    """
+    タスクを set-based の INSERT ... RETURNING でまとめて作成し、RETURNING の値から TaskRead を組み立てる。
+    ORM の add → flush → refresh を行わないので、件数が増えても往復は TASK_INSERT_BATCH_SIZE ごとに1回で済む。
+    """
+    now = dt.datetime.utcnow()
+    rows = [_row(item, now) for item in values]
+    created: list[TaskRead] = []
+    # PostgreSQL では insertmanyvalues により1バッチ1文になり、返る行は入力順にそろえられる
+    stmt = insert(Task).returning(*Task.__table__.columns, sort_by_parameter_order=True)
+    batch_size = max(1, settings.TASK_INSERT_BATCH_SIZE)
+    for start in range(0, len(rows), batch_size):
+        result = db.execute(stmt, rows[start : start + batch_size])
+        created.extend(TaskRead.model_validate(row) for row in result.mappings())
+    if commit:
+        db.commit()
+    return created
+
+
+def update_tasks(db: Session, rows: list[dict], fields: Iterable[str], commit: bool = True) -> list[TaskRead]:
+    """
+    読み込み済みの行（列名 → 値の dict）のうち fields を主キー指定の一括 UPDATE で書き戻す。
+    書き込んだ値から TaskRead を組み立てるので、更新後に読み直さない。
+    """
+    if not rows:
+        return []
+    now = dt.datetime.utcnow()
+    fields = list(fields)
+    db.execute(update(Task), [{"id": row["id"], **{key: row[key] for key in fields}, "updated_at": now} for row in rows])
+    if commit:
+        db.commit()
+    return [TaskRead.model_validate({**row, "updated_at": now}) for row in rows]
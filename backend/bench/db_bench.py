@@ -0,0 +1,139 @@
+"""
+DB 読み出しのスループット比較。同じクエリを
+  sync:  SessionLocal をスレッドプール（FastAPI の def ルーターと同じ anyio の既定 40 スレッド）で実行
+  async: AsyncSessionLocal をイベントループ上で実行
+の2通りで同時実行数を指定して叩き、p50/p95/p99 とスループットを出す。
+
+    DATABASE_URL=postgresql+psycopg://... python -m bench.db_bench --seed --concurrency 200 --requests 2000
+    python -m bench.db_bench --latency-ms 20     # PostgreSQL のみ。pg_sleep で往復の遅さを再現する
+
+--seed を付けると bench.explain_audit と同じ合成データを入れてから測る。
+"""
+
+import argparse
+import asyncio
+import json
+
+import anyio
+from sqlalchemy import select, text
+from sqlalchemy.orm import selectinload
+
+from bench.explain_audit import pick_sample, seed
+from bench.run_bench import _print_table, run_scenario
+from app.db.migrate import migrate
+from app.db.session import AsyncSessionLocal, SessionLocal, engine
+from app.models import Post, Task
+from app.models.task import TaskType
+
+
+def _tasks_query(sample):
+    # GET /tasks?type=daily&date=... と同じ形
+    return (
+        select(Task)
+        .where(Task.user_id == sample.user_id, Task.type == TaskType.daily, Task.date == sample.day)
+        .order_by(Task.created_at.desc(), Task.id.desc())
+        .limit(200)
+    )
+
+
+def _posts_query(sample):
+    # GET /posts?week=... と同じ形（投稿者といいねは selectinload）
+    return (
+        select(Post)
+        .where(Post.week_number == sample.week, Post.user_id.in_([sample.user_id, *sample.friend_ids]))
+        .options(selectinload(Post.user), selectinload(Post.likes))
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(200)
+    )
+
+
+QUERIES = {"tasks": _tasks_query, "posts": _posts_query}
+
+
+def _sleep(dialect: str, latency_ms: float):
+    if latency_ms <= 0:
+        return None
+    if dialect != "postgresql":
+        raise SystemExit("--latency-ms needs PostgreSQL (pg_sleep)")
+    return text("SELECT pg_sleep(:seconds)").bindparams(seconds=latency_ms / 1000)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    migrate(engine)
+    if args.seed:
+        with engine.begin() as conn:
+            seed(conn, args.users, args.tasks_per_user, args.posts_per_user, args.friends_per_user)
+    with engine.connect() as conn:
+        sample = pick_sample(conn)
+    sleep = _sleep(engine.dialect.name, args.latency_ms)
+
+    # 1リクエスト = get_db / get_async_db と同じくセッションを開いて1回読む
+    def sync_call(build):
+        def run() -> str:
+            with SessionLocal() as db:
+                if sleep is not None:
+                    db.execute(sleep)
+                db.scalars(build(sample)).all()
+            return "sync"
+
+        async def call(i: int) -> str:
+            return await anyio.to_thread.run_sync(run)
+
+        return call
+
+    def async_call(build):
+        async def call(i: int) -> str:
+            async with AsyncSessionLocal() as db:
+                if sleep is not None:
+                    await db.execute(sleep)
+                (await db.scalars(build(sample))).all()
+            return "async"
+
+        return call
+
+    if args.thread_limit:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = args.thread_limit
+
+    selected = list(QUERIES) if args.query == "all" else [args.query]
+    rows = []
+    for name in selected:
+        for mode, factory in (("sync", sync_call), ("async", async_call)):
+            call = factory(QUERIES[name])
+            if args.warmup:
+                await run_scenario(f"{name}/{mode}", call, args.warmup, args.concurrency)
+            result = await run_scenario(f"{name}/{mode}", call, args.requests, args.concurrency)
+            rows.append(result.summary())
+
+    report = {
+        "dialect": engine.dialect.name,
+        "concurrency": args.concurrency,
+        "thread_limit": anyio.to_thread.current_default_thread_limiter().total_tokens,
+        "latency_ms": args.latency_ms,
+        "results": rows,
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    _print_table(rows)
+    print(f"dialect={report['dialect']} thread_limit={report['thread_limit']} latency_ms={args.latency_ms}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync (threadpool) vs async session throughput")
+    parser.add_argument("--query", choices=[*QUERIES, "all"], default="all")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulate a slow round trip with pg_sleep")
+    parser.add_argument("--thread-limit", type=int, default=0, help="override the anyio threadpool size (default 40)")
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--tasks-per-user", type=int, default=400)
+    parser.add_argument("--posts-per-user", type=int, default=20)
+    parser.add_argument("--friends-per-user", type=int, default=15)
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+よく使うクエリの実行計画を確認し、対象テーブルのシーケンシャルスキャンを指摘する。
+PostgreSQL では EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)、SQLite では EXPLAIN QUERY PLAN を使う。
+小さいテーブルでは PostgreSQL がわざとシーケンシャルスキャンを選ぶので、--seed でデータを入れてから測る。
+
+    DATABASE_URL=postgresql+psycopg://... python -m bench.explain_audit --seed --users 500
+    python -m bench.explain_audit --json
+
+指摘があれば終了コード 1 を返す（CI でインデックスの抜けを検知する用）。
+"""
+
+import argparse
+import datetime as dt
+import json
+import random
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import and_, case, false, func, insert, or_, select, text, true
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+from app.api.utils.pagination import PageParams, page_query
+from app.db.migrate import migrate
+from app.db.session import engine
+from app.models import Friendship, Goal, Post, Task, User
+from app.models.task import TaskType
+from app.services.feed import POST_LIST_ORDER
+from app.services.goal_plan import plan_query
+from app.services.task_lists import GOAL_TASK_ORDER, TASK_LIST_ORDER
+
+AUDITED_TABLES = {"tasks", "posts", "friendships"}
+
+# 一覧の1ページ目（カーソルなし）で測る
+FIRST_PAGE = PageParams(cursor=None, limit=50)
+
+
+class explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = True):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(explain, "postgresql")
+def _explain_postgresql(element, compiler, **kw):
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+@compiles(explain, "sqlite")
+def _explain_sqlite(element, compiler, **kw):
+    return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kw)
+
+
+@dataclass
+class Sample:
+    user_id: int
+    goal_id: int
+    friend_ids: list[int]
+    day: dt.date
+    week: int
+
+
+# ルーターのクエリと同じ形にそろえる
+HOT_QUERIES: dict[str, Callable[[Sample], object]] = {
+    # tasks.py list_tasks（日次）
+    "tasks.daily_by_date": lambda s: select(Task)
+    .where(Task.user_id == s.user_id, Task.type == TaskType.daily, Task.date == s.day)
+    .order_by(Task.created_at.desc()),
+    # tasks.py list_tasks（週次）
+    "tasks.weekly_by_week": lambda s: select(Task)
+    .where(Task.user_id == s.user_id, Task.type == TaskType.weekly, Task.week_number == s.week)
+    .order_by(Task.created_at.desc()),
+    # analytics.py 週の達成率
+    "analytics.week_done_count": lambda s: select(func.count())
+    .select_from(Task)
+    .where(Task.user_id == s.user_id, Task.type == TaskType.daily, Task.week_number == s.week, Task.is_done == true()),
+    # tasks.py list_tasks の ETag 用の件数・最終更新と1ページ目
+    "tasks.list_version": lambda s: select(func.count(), func.max(Task.updated_at)).where(
+        Task.user_id == s.user_id, Task.type == TaskType.daily, Task.date == s.day
+    ),
+    "tasks.list_page": lambda s: page_query(
+        select(Task).where(Task.user_id == s.user_id, Task.type == TaskType.daily, Task.date == s.day),
+        TASK_LIST_ORDER,
+        FIRST_PAGE,
+    ),
+    # tasks.py 目標ごとのタスク一覧
+    "tasks.by_goal": lambda s: page_query(select(Task).where(Task.goal_id == s.goal_id), GOAL_TASK_ORDER, FIRST_PAGE),
+    "tasks.by_goal_daily_date": lambda s: select(Task).where(
+        Task.goal_id == s.goal_id, Task.type == TaskType.daily, Task.date == s.day
+    ),
+    # carry_over.py 持ち越し対象
+    "carry_over.open_daily": lambda s: select(Task.id).where(
+        Task.user_id == s.user_id,
+        Task.type == TaskType.daily,
+        Task.is_done == false(),
+        Task.date.is_not(None),
+        Task.date < s.day,
+    ),
+    # task_lists.py today_tasks（/me/today）
+    "me.today_tasks": lambda s: page_query(
+        select(Task).where(
+            Task.user_id == s.user_id,
+            or_(
+                and_(Task.type == TaskType.daily, Task.date == s.day),
+                and_(Task.type == TaskType.weekly, Task.week_number == s.week),
+                and_(Task.type == TaskType.monthly, Task.month == s.day.month),
+            ),
+        ),
+        TASK_LIST_ORDER,
+        FIRST_PAGE,
+    ),
+    # goal_plan.py 目標の計画（1週間分）
+    "goals.plan_week": lambda s: plan_query(s.goal_id, s.day, s.day + dt.timedelta(days=6)),
+    # analytics.py ランキングの ETag 用の件数と ranking.py の GROUP BY
+    "analytics.ranking_version": lambda s: select(func.count(), func.max(Task.updated_at)).where(
+        Task.user_id.in_([s.user_id, *s.friend_ids]), Task.type == TaskType.daily, Task.week_number == s.week
+    ),
+    "ranking.weekly_counts": lambda s: select(
+        Task.user_id, func.count(), func.sum(case((Task.is_done == true(), 1), else_=0))
+    )
+    .where(Task.user_id.in_([s.user_id, *s.friend_ids]), Task.type == TaskType.daily, Task.week_number == s.week)
+    .group_by(Task.user_id),
+    # posts.py 週のフィードの ETag 用の件数・最終更新と1ページ目
+    "posts.list_version": lambda s: select(func.count(), func.max(Post.updated_at), func.max(User.updated_at))
+    .join(User, User.id == Post.user_id)
+    .where(Post.week_number == s.week, Post.user_id.in_([s.user_id, *s.friend_ids])),
+    "posts.week_feed": lambda s: page_query(
+        select(Post).where(Post.week_number == s.week, Post.user_id.in_([s.user_id, *s.friend_ids])),
+        POST_LIST_ORDER,
+        FIRST_PAGE,
+    ),
+    # friendships.py 受け取った申請・承認済み
+    "friendships.pending_received": lambda s: select(Friendship.id).where(
+        Friendship.friend_id == s.user_id, Friendship.status == "pending"
+    ),
+    "friendships.accepted_received": lambda s: select(Friendship.id).where(
+        Friendship.friend_id == s.user_id, Friendship.status == "accepted"
+    ),
+}
+
+
+def seed(conn: Connection, users: int, tasks_per_user: int, posts_per_user: int, friends_per_user: int) -> None:
+    """監査用のデータをまとめて入れる。既存データには触らない（メールアドレスに接頭辞を付ける）。"""
+    rng = random.Random(42)
+    today = dt.date.today()
+    now = dt.datetime.utcnow()
+    tag = now.strftime("%Y%m%d%H%M%S")
+    user_ids = list(
+        conn.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [
+                {"email": f"audit-{tag}-{i}@example.com", "name": f"audit{i}", "password_hash": "x"}
+                for i in range(users)
+            ],
+        )
+    )
+    goal_ids = list(
+        conn.scalars(
+            insert(Goal).returning(Goal.id, sort_by_parameter_order=True),
+            [{"user_id": user_id, "title": "audit goal", "created_at": now, "updated_at": now} for user_id in user_ids],
+        )
+    )
+    for user_id, goal_id in zip(user_ids, goal_ids):
+        rows = []
+        for i in range(tasks_per_user):
+            task_type = rng.choices([TaskType.daily, TaskType.weekly, TaskType.monthly], weights=[8, 2, 1])[0]
+            day = today - dt.timedelta(days=rng.randint(-30, 90))
+            rows.append(
+                {
+                    "user_id": user_id,
+                    "goal_id": goal_id,
+                    "type": task_type,
+                    "title": f"task {i}",
+                    "date": day if task_type == TaskType.daily else None,
+                    "week_number": day.isocalendar()[1],
+                    "month": day.month,
+                    "is_done": rng.random() < 0.6,
+                    "carried_over": False,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            )
+        conn.execute(insert(Task), rows)
+        conn.execute(
+            insert(Post),
+            [
+                {
+                    "user_id": user_id,
+                    "date": today - dt.timedelta(weeks=w),
+                    "week_number": (today - dt.timedelta(weeks=w)).isocalendar()[1],
+                    "comment": "audit",
+                    "achieved": rng.random(),
+                    "created_at": now - dt.timedelta(weeks=w),
+                }
+                for w in range(posts_per_user)
+            ],
+        )
+        friends = rng.sample([u for u in user_ids if u != user_id], min(friends_per_user, len(user_ids) - 1))
+        if friends:
+            conn.execute(
+                insert(Friendship),
+                [
+                    {"user_id": user_id, "friend_id": friend_id, "status": rng.choice(["pending", "accepted"]), "created_at": now}
+                    for friend_id in friends
+                ],
+            )
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ANALYZE tasks, posts, friendships"))
+    else:
+        conn.execute(text("ANALYZE"))
+
+
+def pick_sample(conn: Connection) -> Sample:
+    """一番タスクの多いユーザーを基準にする（最悪に近いケース）。"""
+    user_id = conn.scalar(select(Task.user_id).group_by(Task.user_id).order_by(func.count().desc()).limit(1))
+    if user_id is None:
+        raise SystemExit("tasks table is empty; run with --seed")
+    goal_id = conn.scalar(select(Task.goal_id).where(Task.user_id == user_id, Task.goal_id.is_not(None)).limit(1)) or 0
+    friend_ids = list(conn.scalars(select(Friendship.friend_id).where(Friendship.user_id == user_id)))
+    today = dt.date.today()
+    return Sample(user_id=user_id, goal_id=goal_id, friend_ids=friend_ids, day=today, week=today.isocalendar()[1])
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def audit_query(conn: Connection, name: str, statement, analyze: bool) -> dict:
+    if conn.dialect.name == "postgresql":
+        raw = conn.execute(explain(statement, analyze)).scalar_one()
+        document = (raw if isinstance(raw, list) else json.loads(raw))[0]
+        nodes = list(_walk(document["Plan"]))
+        seq_scans = sorted(
+            {n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan" and n.get("Relation Name") in AUDITED_TABLES}
+        )
+        indexes = sorted({n["Index Name"] for n in nodes if n.get("Index Name")})
+        return {
+            "query": name,
+            "seq_scans": seq_scans,
+            "indexes": indexes,
+            "execution_ms": document.get("Execution Time"),
+            "planning_ms": document.get("Planning Time"),
+        }
+
+    details = [row[-1] for row in conn.execute(explain(statement, analyze))]
+    seq_scans = sorted(
+        {
+            d.split()[1]
+            for d in details
+            if d.startswith("SCAN ") and "USING" not in d and d.split()[1] in AUDITED_TABLES
+        }
+    )
+    return {"query": name, "seq_scans": seq_scans, "plan": details}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EXPLAIN audit of hot queries")
+    parser.add_argument("--seed", action="store_true", help="insert synthetic rows before auditing")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--tasks-per-user", type=int, default=400)
+    parser.add_argument("--posts-per-user", type=int, default=20)
+    parser.add_argument("--friends-per-user", type=int, default=15)
+    parser.add_argument("--no-analyze", action="store_true", help="plan only, do not execute the queries")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    migrate(engine)
+    if args.seed:
+        with engine.begin() as conn:
+            seed(conn, args.users, args.tasks_per_user, args.posts_per_user, args.friends_per_user)
+
+    with engine.connect() as conn:
+        sample = pick_sample(conn)
+        results = [audit_query(conn, name, build(sample), not args.no_analyze) for name, build in HOT_QUERIES.items()]
+
+    flagged = [r for r in results if r["seq_scans"]]
+    if args.json:
+        print(json.dumps({"results": results, "flagged": [r["query"] for r in flagged]}, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            status = "SEQ SCAN " + ",".join(r["seq_scans"]) if r["seq_scans"] else "ok"
+            via = ",".join(r.get("indexes", [])) or " | ".join(r.get("plan", []))
+            timing = f" {r['execution_ms']:.2f}ms" if r.get("execution_ms") is not None else ""
+            print(f"{r['query']:<32} {status:<20}{timing}  {via}")
+        print(f"{len(flagged)} of {len(results)} queries use a sequential scan")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
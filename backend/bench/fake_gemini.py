@@ -0,0 +1,315 @@
+"""
+ローカル用の Gemini 代替サーバー。generateContent / streamGenerateContent (alt=sse) と同じ形式で応答する。
+
+    python -m bench.fake_gemini --port 8787 --latency lognormal:0.0,0.5 --error-429 0.05
+
+アプリ側は GEMINI_BASE_URL=http://127.0.0.1:8787 で向き先を切り替える。
+応答本文は fixtures ディレクトリ（プロンプトの sha256 をファイル名にした JSON）を優先し、
+無ければプロンプトの種類（分解・詳細TODO・修正提案）から決定的に組み立てる。
+--record を付けると本物の API に中継し、得られた本文を fixtures に保存する（GEMINI_API_KEY が必要）。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+UPSTREAM_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_MODELS = ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-1.5-flash-latest", "gemini-1.5-flash"]
+
+
+@dataclass
+class LatencyModel:
+    """応答までの待ち時間（秒）。fixed:S / uniform:LO,HI / lognormal:MU,SIGMA の形式で指定する。"""
+
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, raw = spec.partition(":")
+        values = [float(v) for v in raw.split(",") if v.strip()] if raw else []
+        if kind == "fixed":
+            return cls(kind, values[0] if values else 0.0)
+        if kind in ("uniform", "lognormal") and len(values) == 2:
+            return cls(kind, values[0], values[1])
+        raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(self.a, self.b)
+        return self.a
+
+
+@dataclass
+class FakeConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    chunk_delay: float = 0.05
+    chunk_chars: int = 40
+    error_404: float = 0.0
+    error_429: float = 0.0
+    error_5xx: float = 0.0
+    error_malformed: float = 0.0
+    models: list[str] = field(default_factory=lambda: list(DEFAULT_MODELS))
+    fixtures_dir: Path | None = None
+    record: bool = False
+    upstream_url: str = UPSTREAM_URL
+    seed: int | None = None
+
+
+def prompt_of(payload: dict) -> str:
+    try:
+        return payload["contents"][0]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+
+
+def fixture_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _json_after(prompt: str, marker: str) -> object:
+    idx = prompt.find(marker)
+    if idx == -1:
+        return None
+    raw = prompt[idx + len(marker) :].strip()
+    try:
+        return json.loads(raw.splitlines()[0]) if raw else None
+    except json.JSONDecodeError:
+        return None
+
+
+def _int_after(pattern: str, prompt: str, default: int) -> int:
+    m = re.search(pattern, prompt)
+    return int(m.group(1)) if m else default
+
+
+def synthesize_text(prompt: str) -> str:
+    """プロンプトの種類を見分けて、アプリのパーサが受け付ける JSON 文字列を返す。"""
+    if '"assistant_message"' in prompt:
+        draft = _json_after(prompt, "ドラフトタスク（各タスクに date/month/week_number が含まれる場合、そのタスクの期間を示す）:")
+        proposals = []
+        for task in (draft or [])[:3]:
+            proposals.append(
+                {
+                    "target_task_id": task.get("task_id"),
+                    "target_type": task.get("task_type", "daily"),
+                    "before": task.get("title", ""),
+                    "after": f"{task.get('title', '')}（具体化）",
+                    "reason": "より具体的にするため",
+                }
+            )
+        return json.dumps({"assistant_message": "修正案を作成しました。", "proposals": proposals}, ensure_ascii=False)
+
+    if '"details"' in prompt:
+        titles = _json_after(prompt, "日次タスク:") or []
+        details = [[f"{title}: 準備", f"{title}: 実行", f"{title}: 振り返り"] for title in titles]
+        return json.dumps({"details": details}, ensure_ascii=False)
+
+    if '"monthly"' in prompt:
+        months = _int_after(r"直近(\d+)ヶ月", prompt, 3)
+        weeks = _int_after(r"最大(\d+)件", prompt, 4)
+        days = _int_after(r"から(\d+)日間", prompt, 7)
+        return json.dumps(
+            {
+                "monthly": [f"{i + 1}ヶ月目の到達目標" for i in range(months)],
+                "weekly": [f"{i + 1}週目の到達目標" for i in range(weeks)],
+                "daily": [f"{i + 1}日目のTODO" for i in range(days)],
+            },
+            ensure_ascii=False,
+        )
+
+    return "{}"
+
+
+def gemini_body(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
+
+
+class FakeGemini:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats: dict[str, int] = {}
+        self._upstream: httpx.AsyncClient | None = None
+
+    def _count(self, key: str) -> None:
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _load_fixture(self, prompt: str) -> str | None:
+        if self.config.fixtures_dir is None:
+            return None
+        path = self.config.fixtures_dir / f"{fixture_key(prompt)}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))["text"]
+
+    def _save_fixture(self, prompt: str, text: str) -> None:
+        if self.config.fixtures_dir is None:
+            return
+        self.config.fixtures_dir.mkdir(parents=True, exist_ok=True)
+        path = self.config.fixtures_dir / f"{fixture_key(prompt)}.json"
+        path.write_text(json.dumps({"prompt": prompt, "text": text}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    async def _record(self, version: str, model: str, payload: dict, key: str | None) -> tuple[int, str]:
+        if self._upstream is None:
+            self._upstream = httpx.AsyncClient(timeout=httpx.Timeout(90.0, connect=10.0))
+        url = f"{self.config.upstream_url}/{version}/models/{model}:generateContent"
+        res = await self._upstream.post(url, params={"key": key}, json=payload)
+        if res.status_code != 200:
+            return res.status_code, res.text
+        text = res.json()["candidates"][0]["content"]["parts"][0]["text"]
+        self._save_fixture(prompt_of(payload), text)
+        return 200, text
+
+    def _injected_error(self, model: str):
+        if model not in self.config.models:
+            self._count("404_unknown_model")
+            return JSONResponse(status_code=404, content={"error": {"code": 404, "status": "NOT_FOUND"}})
+        roll = self.rng.random()
+        for status, rate in ((404, self.config.error_404), (429, self.config.error_429), (503, self.config.error_5xx)):
+            if roll < rate:
+                self._count(f"{status}_injected")
+                return JSONResponse(status_code=status, content={"error": {"code": status}})
+            roll -= rate
+        return None
+
+    def _malformed(self) -> bool:
+        if self.rng.random() < self.config.error_malformed:
+            self._count("malformed_injected")
+            return True
+        return False
+
+    async def _response_text(self, version: str, model: str, payload: dict, key: str | None) -> tuple[int, str]:
+        prompt = prompt_of(payload)
+        if self.config.record:
+            self._count("recorded")
+            return await self._record(version, model, payload, key)
+        text = self._load_fixture(prompt)
+        if text is not None:
+            self._count("fixture")
+            return 200, text
+        self._count("synthesized")
+        return 200, synthesize_text(prompt)
+
+    async def generate(self, version: str, model: str, payload: dict, key: str | None):
+        await asyncio.sleep(self.config.latency.sample(self.rng))
+        error = self._injected_error(model)
+        if error is not None:
+            return error
+        if self._malformed():
+            return PlainTextResponse('{"candidates": [{"content": {"parts": [{"text": "{\\"monthly\\": [', media_type="application/json")
+        status, text = await self._response_text(version, model, payload, key)
+        if status != 200:
+            return PlainTextResponse(text, status_code=status)
+        return JSONResponse(gemini_body(text))
+
+    async def stream(self, version: str, model: str, payload: dict, key: str | None):
+        # 最初のチャンクまでの待ち時間を latency として扱い、以降は chunk_delay ごとに送る
+        await asyncio.sleep(self.config.latency.sample(self.rng))
+        error = self._injected_error(model)
+        if error is not None:
+            return error
+        malformed = self._malformed()
+        status, text = await self._response_text(version, model, payload, key)
+        if status != 200:
+            return PlainTextResponse(text, status_code=status)
+
+        size = max(1, self.config.chunk_chars)
+        chunks = [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+        async def events():
+            for idx, chunk in enumerate(chunks):
+                if idx:
+                    await asyncio.sleep(self.config.chunk_delay)
+                if malformed and idx == len(chunks) // 2:
+                    yield "data: {not json\n\n"
+                    return
+                yield f"data: {json.dumps(gemini_body(chunk), ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    fake = FakeGemini(config)
+    app = FastAPI(title="Fake Gemini")
+    app.state.fake = fake
+
+    @app.post("/{version}/models/{target}")
+    async def models(version: str, target: str, request: Request):
+        model, _, method = target.partition(":")
+        payload = await request.json()
+        key = request.query_params.get("key")
+        fake._count(method or "unknown")
+        if method == "generateContent":
+            return await fake.generate(version, model, payload, key)
+        if method == "streamGenerateContent":
+            return await fake.stream(version, model, payload, key)
+        return JSONResponse(status_code=404, content={"error": {"code": 404, "status": "NOT_FOUND"}})
+
+    @app.get("/_stats")
+    def stats():
+        return dict(fake.stats)
+
+    @app.post("/_reset")
+    def reset():
+        fake.stats.clear()
+        return {"ok": True}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="fixed:0.2", help="fixed:S | uniform:LO,HI | lognormal:MU,SIGMA")
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    parser.add_argument("--error-404", type=float, default=0.0)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    parser.add_argument("--error-malformed", type=float, default=0.0)
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="応答するモデル名（それ以外は 404）")
+    parser.add_argument("--fixtures", type=Path, default=None)
+    parser.add_argument("--record", action="store_true", help="本物の API に中継して fixtures に保存する")
+    parser.add_argument("--upstream", default=UPSTREAM_URL)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.record and args.fixtures is None:
+        parser.error("--record には --fixtures が必要です")
+
+    config = FakeConfig(
+        latency=LatencyModel.parse(args.latency),
+        chunk_delay=args.chunk_delay,
+        chunk_chars=args.chunk_chars,
+        error_404=args.error_404,
+        error_429=args.error_429,
+        error_5xx=args.error_5xx,
+        error_malformed=args.error_malformed,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        fixtures_dir=args.fixtures,
+        record=args.record,
+        upstream_url=args.upstream.rstrip("/"),
+        seed=args.seed,
+    )
+
+    import uvicorn
+
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+AI 経路のレイテンシ計測。build_breakdown と generate_revision_suggestions を同時実行数を指定して叩き、
+p50/p95/p99 とスループットを出す。事前に bench.fake_gemini を起動しておく。
+
+    python -m bench.fake_gemini --port 8787 --latency uniform:0.2,1.0 &
+    python -m bench.run_bench --base-url http://127.0.0.1:8787 --requests 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    sources: dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    wall_seconds: float = 0.0
+
+    def summary(self) -> dict:
+        data = sorted(self.latencies)
+
+        def pct(p: float) -> float | None:
+            if not data:
+                return None
+            idx = min(len(data) - 1, max(0, round(p / 100 * len(data) + 0.5) - 1))
+            return round(data[idx] * 1000, 1)
+
+        return {
+            "scenario": self.name,
+            "requests": len(data) + self.errors,
+            "errors": self.errors,
+            "sources": dict(self.sources),
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+            "max_ms": round(data[-1] * 1000, 1) if data else None,
+            "mean_ms": round(statistics.fmean(data) * 1000, 1) if data else None,
+            "throughput_rps": round(len(data) / self.wall_seconds, 2) if self.wall_seconds else None,
+        }
+
+
+async def run_scenario(
+    name: str, call: Callable[[int], Awaitable[str]], requests: int, concurrency: int
+) -> Result:
+    result = Result(name)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            started = time.perf_counter()
+            try:
+                source = await call(i)
+            except Exception:
+                result.errors += 1
+                return
+            result.latencies.append(time.perf_counter() - started)
+            result.sources[source] = result.sources.get(source, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    result.wall_seconds = time.perf_counter() - started
+    return result
+
+
+def _print_table(rows: list[dict]) -> None:
+    cols = ["scenario", "requests", "errors", "p50_ms", "p95_ms", "p99_ms", "max_ms", "throughput_rps"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in cols))
+    for row in rows:
+        print(f"{row['scenario']} sources: {row['sources']}")
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    # settings は import 時に読まれるので、向き先の切り替えはアプリを import する前に行う
+    os.environ["GEMINI_BASE_URL"] = args.base_url
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from app.models.goal import Goal
+    from app.models.task import TaskType
+    from app.models.user import User
+    from app.schemas.task import DraftTask
+    from app.services.breakdown_cache import breakdown_cache
+    from app.services.gemini_client import (
+        close_gemini_client,
+        endpoint_resolver,
+        gemini_breaker,
+        gemini_stats,
+        start_gemini_client,
+    )
+    from app.services.task_service import build_breakdown, generate_revision_suggestions
+
+    await start_gemini_client()
+    # 無料枠チェックで DB に触れないようプレミアムの一時ユーザーで実行する
+    user = User(id=0, email="bench@example.com", name="bench", is_premium=True)
+    deadline = dt.date.today() + dt.timedelta(days=120)
+
+    async def breakdown(i: int) -> str:
+        # 毎回タイトルを変えてキャッシュを外す（--cache 指定時は同じ入力を繰り返す）
+        title = "TOEIC 800点" if args.cache else f"TOEIC 800点 #{i}"
+        goal = Goal(id=0, user_id=0, title=title, deadline=deadline)
+        res = await build_breakdown(user, goal, 4, 4, 7, current_situation="現在600点")
+        return res.source
+
+    draft = [
+        DraftTask(task_id=idx + 1, task_type=tier, title=f"{tier.value} task {idx + 1}")
+        for idx, tier in enumerate([TaskType.monthly, TaskType.weekly] + [TaskType.daily] * 5)
+    ]
+
+    async def revision(i: int) -> str:
+        res = await generate_revision_suggestions("TOEIC 800点", f"もっと具体的にして #{i}", draft, [])
+        return res.source
+
+    scenarios = {"breakdown": breakdown, "revision": revision}
+    selected = list(scenarios) if args.scenario == "all" else [args.scenario]
+
+    rows = []
+    try:
+        for name in selected:
+            if args.warmup:
+                await run_scenario(name, scenarios[name], args.warmup, args.concurrency)
+            breakdown_cache.clear()
+            result = await run_scenario(name, scenarios[name], args.requests, args.concurrency)
+            rows.append(result.summary())
+    finally:
+        await close_gemini_client()
+
+    report = {
+        "results": rows,
+        "gemini_calls": dict(gemini_stats),
+        "endpoint": endpoint_resolver.snapshot(),
+        "circuit": gemini_breaker.snapshot(),
+        "breakdown_cache": breakdown_cache.stats(),
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+        return
+    _print_table(rows)
+    print(f"gemini calls: {report['gemini_calls']}")
+    print(f"circuit: {report['circuit']['state']} transitions={report['circuit']['transitions']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Latency benchmark for the Gemini-backed paths")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8787")
+    parser.add_argument("--scenario", choices=["breakdown", "revision", "all"], default="all")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--cache", action="store_true", help="同じ入力を繰り返して分解キャッシュを効かせる")
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -70,6 +70,18 @@ apiClient.interceptors.response.use(
   }
 );
 
+// 一覧 API はキーセットページネーション。X-Next-Cursor が返らなくなるまで続きを取得する
+async function fetchAllPages<T>(url: string, params: Record<string, unknown> = {}) {
+  const items: T[] = [];
+  let cursor: string | undefined;
+  do {
+    const res = await apiClient.get<T[]>(url, { params: cursor ? { ...params, cursor } : params });
+    items.push(...res.data);
+    cursor = res.headers["x-next-cursor"] || undefined;
+  } while (cursor);
+  return items;
+}
+
 function getCurrentUserId() {
   const session = getAuthSession();
   return session?.userId ?? DEFAULT_USER_ID;
@@ -124,10 +136,7 @@ export async function login(payload: { email: string; password: string }) {
 
 export async function fetchDailyTasks() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Task[]>("/tasks", {
-    params: { user_id: userId, type: "daily", date: today },
-  });
-  return res.data;
+  return fetchAllPages<Task>("/tasks", { user_id: userId, type: "daily", date: today });
 }
 
 export async function toggleTaskDone(taskId: number) {
@@ -142,8 +151,7 @@ export async function carryOverTask(taskId: number) {
 
 export async function fetchGoals() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Goal[]>("/goals", { params: { user_id: userId } });
-  return res.data;
+  return fetchAllPages<Goal>("/goals", { user_id: userId });
 }
 
 export async function createGoal(payload: { title: string; deadline?: string; currentSituation?: string }) {
@@ -201,8 +209,7 @@ export async function createGoalAndBreakdown(payload: {
 }
 
 export async function fetchGoalTasks(goalId: number) {
-  const res = await apiClient.get<Task[]>(`/goals/${goalId}/tasks`);
-  return res.data;
+  return fetchAllPages<Task>(`/goals/${goalId}/tasks`);
 }
 
 export async function revisionChat(payload: {
@@ -237,18 +244,12 @@ export async function applyAcceptedRevisions(payload: {
 
 export async function fetchWeeklyTasks() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Task[]>("/tasks", {
-    params: { user_id: userId, type: "weekly", week_number: isoWeek },
-  });
-  return res.data;
+  return fetchAllPages<Task>("/tasks", { user_id: userId, type: "weekly", week_number: isoWeek });
 }
 
 export async function fetchWeeklyDailyTasks() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Task[]>("/tasks", {
-    params: { user_id: userId, type: "daily", week_number: isoWeek },
-  });
-  return res.data;
+  return fetchAllPages<Task>("/tasks", { user_id: userId, type: "daily", week_number: isoWeek });
 }
 
 export async function updateTask(taskId: number, payload: Partial<Task>) {
@@ -287,10 +288,7 @@ export async function createTask(payload: {
 
 export async function fetchPosts() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Post[]>("/posts", {
-    params: { user_id: userId, week: isoWeek },
-  });
-  return res.data;
+  return fetchAllPages<Post>("/posts", { user_id: userId, week: isoWeek });
 }
 
 export async function createPost(payload: { comment: string; achieved: number; group_id?: number }) {
@@ -328,10 +326,7 @@ export async function fetchFriends() {
 }
 export async function fetchAllDailyTasks() {
   const userId = getCurrentUserId();
-  const res = await apiClient.get<Task[]>("/tasks", {
-    params: { user_id: userId, type: "daily" },
-  });
-  return res.data;
+  return fetchAllPages<Task>("/tasks", { user_id: userId, type: "daily" });
 }
 export async function fetchUser() {
   const userId = getCurrentUserId();
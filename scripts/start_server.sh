@@ -1,9 +1,9 @@
 #!/bin/bash
 
-# 不足しているDBカラムを追加（既存ならスキップ）
+# DBマイグレーション（適用済みならスキップ）。失敗したら旧バージョンのまま再起動しない
 cd /home/ec2-user/streeeak/backend
 source .venv/bin/activate
-python fix_db.py || true
+python -m app.db.migrate || exit 1
 cd - > /dev/null
 
 # Ubuntu環境に合わせてパスとユーザーを修正